@@ -1,13 +1,13 @@
 import json
 import logging
-from typing import Optional
-from httpx import Limits
+from typing import Any, Mapping, Optional, Union
+from httpx import AsyncBaseTransport, AsyncClient, BaseTransport, Client, Limits
 from dataclasses import dataclass
 
 
 from agentbox.api.client.client import AuthenticatedClient
 from agentbox.connection_config import ConnectionConfig
-from agentbox.api.metadata import default_headers
+from agentbox.api.metadata import get_default_headers
 from agentbox.exceptions import (
     AuthenticationException,
     SandboxException,
@@ -22,7 +22,7 @@ logger = logging.getLogger(__name__)
 class SandboxCreateResponse:
     sandbox_id: str
     envd_version: str
-    envd_access_token: str
+    envd_access_token: Optional[str]
 
 
 def handle_api_exception(e: Response):
@@ -41,6 +41,27 @@ def handle_api_exception(e: Response):
     return SandboxException(f"{e.status_code}: {e.content}")
 
 
+class _RequestHeadersClient:
+    """
+    View of a shared httpx client that sends the API key and headers of one connection config with every request.
+
+    The generated API functions only call `request()`, so this is all they need.
+    """
+
+    __slots__ = ("_client", "_headers")
+
+    def __init__(self, client: Union[Client, AsyncClient], headers: Mapping[str, str]):
+        self._client = client
+        self._headers = headers
+
+    def request(self, *args, headers: Optional[Mapping[str, str]] = None, **kwargs) -> Any:
+        if headers:
+            headers = {**self._headers, **headers}
+        else:
+            headers = self._headers
+        return self._client.request(*args, headers=headers, **kwargs)
+
+
 class ApiClient(AuthenticatedClient):
     """
     The client for interacting with the E2B API.
@@ -52,6 +73,8 @@ class ApiClient(AuthenticatedClient):
         require_api_key: bool = True,
         require_access_token: bool = False,
         limits: Optional[Limits] = None,
+        transport: Optional[Union[BaseTransport, AsyncBaseTransport]] = None,
+        http_client: Optional[Union[Client, AsyncClient]] = None,
         *args,
         **kwargs,
     ):
@@ -87,7 +110,7 @@ class ApiClient(AuthenticatedClient):
         prefix = "" if require_api_key else "Bearer"
 
         headers = {
-            **default_headers,
+            **get_default_headers(),
             **(config.headers or {}),
         }
 
@@ -98,8 +121,13 @@ class ApiClient(AuthenticatedClient):
                     "request": [self._log_request],
                     "response": [self._log_response],
                 },
-                "proxy": config.proxy,
+                # httpx mounts a proxy over the transport, a shared transport
+                # is already set up for the proxy
+                "proxy": config.proxy if transport is None else None,
                 "limits": limits,
+                "http2": True,
+                # A shared transport brings its own pool, limits and proxy
+                "transport": transport,
             },
             headers=headers,
             token=token,
@@ -109,23 +137,86 @@ class ApiClient(AuthenticatedClient):
             **kwargs,
         )
 
-    def _log_request(self, request):
-        logger.info(f"Request {request.method} {request.url}")
+        if http_client is not None:
+            # The shared client carries the connection pool, the API key and
+            # headers of this config are sent per request instead.
+            request_headers = {
+                **(config.headers or {}),
+                auth_header_name: f"{prefix} {token}" if prefix else token,
+            }
+            view = _RequestHeadersClient(http_client, request_headers)
+            if isinstance(http_client, AsyncClient):
+                self.set_async_httpx_client(view)  # type: ignore[arg-type]
+            else:
+                self.set_httpx_client(view)  # type: ignore[arg-type]
+
+    @classmethod
+    def create_http_client(
+        cls,
+        config: ConnectionConfig,
+        transport: Optional[BaseTransport] = None,
+    ) -> Client:
+        """
+        Create an httpx client for the API host of `config` that can be shared by `ApiClient`s with different API keys and headers.
+        """
+        return Client(
+            base_url=config.api_url,
+            headers=get_default_headers(),
+            event_hooks={
+                "request": [cls._log_request],
+                "response": [cls._log_response],
+            },
+            proxy=config.proxy if transport is None else None,
+            http2=True,
+            transport=transport,
+            # Like `AuthenticatedClient`, API calls have no timeout
+            timeout=None,
+        )
 
-    def _log_response(self, response: Response):
+    @staticmethod
+    def _log_request(request):
+        logger.info("Request %s %s", request.method, request.url)
+
+    @staticmethod
+    def _log_response(response: Response):
         if response.status_code >= 400:
-            logger.error(f"Response {response.status_code}")
+            logger.error("Response %s", response.status_code)
         else:
-            logger.info(f"Response {response.status_code}")
+            logger.info("Response %s", response.status_code)
 
 
 # We need to override the logging hooks for the async usage
 class AsyncApiClient(ApiClient):
-    async def _log_request(self, request):
-        logger.info(f"Request {request.method} {request.url}")
+    @classmethod
+    def create_http_client(
+        cls,
+        config: ConnectionConfig,
+        transport: Optional[AsyncBaseTransport] = None,
+    ) -> AsyncClient:
+        """
+        Create an async httpx client for the API host of `config` that can be shared by `AsyncApiClient`s with different API keys and headers.
+        """
+        return AsyncClient(
+            base_url=config.api_url,
+            headers=get_default_headers(),
+            event_hooks={
+                "request": [cls._log_request],
+                "response": [cls._log_response],
+            },
+            proxy=config.proxy if transport is None else None,
+            http2=True,
+            transport=transport,
+            # Like `AuthenticatedClient`, API calls have no timeout
+            timeout=None,
+        )
+
+    @staticmethod
+    async def _log_request(request):
+        logger.info("Request %s %s", request.method, request.url)
 
-    async def _log_response(self, response: Response):
+    @staticmethod
+    async def _log_response(response: Response):
         if response.status_code >= 400:
-            logger.error(f"Response {response.status_code}")
+            logger.error("Response %s", response.status_code)
         else:
-            logger.info(f"Response {response.status_code}")
+            logger.info("Response %s", response.status_code)
@@ -1,21 +1,47 @@
+import functools
 import platform
 
 from importlib import metadata
+from types import MappingProxyType
+from typing import Mapping
 
-try:
-    version = metadata.version("agentbox-python-sdk")
-except metadata.PackageNotFoundError:
-    version = "dev"
-
-default_headers = {
-    "lang": "python",
-    "lang_version": platform.python_version(),
-    "machine": platform.machine(),
-    "os": platform.platform(),
-    "package_version": version,
-    "processor": platform.processor(),
-    "publisher": "agentbox",
-    "release": platform.release(),
-    "sdk_runtime": "python",
-    "system": platform.system(),
-}
+
+@functools.lru_cache(maxsize=None)
+def get_package_version() -> str:
+    try:
+        return metadata.version("agentbox-python-sdk")
+    except metadata.PackageNotFoundError:
+        return "dev"
+
+
+@functools.lru_cache(maxsize=None)
+def get_default_headers() -> Mapping[str, str]:
+    # platform.uname() resolves machine, processor, release and system in one
+    # go, the individual platform.* helpers would each re-enter it.
+    uname = platform.uname()
+
+    # Read-only, so it can be shared by every client without defensive copies.
+    return MappingProxyType(
+        {
+            "lang": "python",
+            "lang_version": platform.python_version(),
+            "machine": uname.machine,
+            "os": platform.platform(),
+            "package_version": get_package_version(),
+            "processor": uname.processor,
+            "publisher": "agentbox",
+            "release": uname.release,
+            "sdk_runtime": "python",
+            "system": uname.system,
+        }
+    )
+
+
+def __getattr__(name: str):
+    # `version` and `default_headers` are resolved on first access, so importing
+    # the SDK does not query the platform or the package metadata up front.
+    if name == "version":
+        return get_package_version()
+    if name == "default_headers":
+        return get_default_headers()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,6 +1,7 @@
 import os
 
-from typing import Literal, Optional, Dict
+from types import MappingProxyType
+from typing import Any, Literal, Mapping, Optional, Dict
 from httpx._types import ProxyTypes
 
 REQUEST_TIMEOUT: float = 30.0  # 30 seconds
@@ -8,6 +9,9 @@ REQUEST_TIMEOUT: float = 30.0  # 30 seconds
 KEEPALIVE_PING_INTERVAL_SEC = 50  # 50 seconds
 KEEPALIVE_PING_HEADER = "Keepalive-Ping-Interval"
 
+# Shared by every config created without headers, read-only so it stays empty
+_NO_HEADERS: Mapping[str, str] = MappingProxyType({})
+
 
 class ConnectionConfig:
     """
@@ -44,8 +48,8 @@ class ConnectionConfig:
         self.debug = debug or ConnectionConfig._debug()
         self.api_key = api_key or ConnectionConfig._api_key()
         self.access_token = access_token or ConnectionConfig._access_token()
-        self.headers = headers or {}
         self.proxy = proxy
+        self.headers = headers or _NO_HEADERS
 
         self.request_timeout = ConnectionConfig._get_request_timeout(
             REQUEST_TIMEOUT,
@@ -78,6 +82,50 @@ class ConnectionConfig:
     def get_request_timeout(self, request_timeout: Optional[float] = None):
         return self._get_request_timeout(self.request_timeout, request_timeout)
 
+    @property
+    def headers(self) -> Mapping[str, str]:
+        return self._headers
+
+    @headers.setter
+    def headers(self, headers: Mapping[str, str]):
+        self._headers = headers
+        # The envd access token is the only value set after construction, the
+        # default get_api_params() result is rebuilt on its next call
+        self._api_params: Optional[Mapping[str, Any]] = None
+
+    def get_api_params(
+        self, request_timeout: Optional[float] = None, **opts
+    ) -> Mapping[str, Any]:
+        """
+        Keyword arguments for the `SandboxApi` calls made on behalf of a sandbox, `opts` override the stored values.
+
+        The result is read-only when nothing is overridden, copy it before making changes. The config itself is never modified.
+        """
+        # Most configs are built by a single SandboxApi call and never get here
+        if self._api_params is None:
+            self._api_params = MappingProxyType(
+                {
+                    "api_key": self.api_key,
+                    "domain": self.domain,
+                    "debug": self.debug,
+                    "request_timeout": self.request_timeout,
+                    "headers": self._headers,
+                    "proxy": self.proxy,
+                }
+            )
+
+        if not request_timeout and not opts:
+            # Callers unpack it into keyword arguments, so it can be shared
+            return self._api_params
+
+        params = dict(self._api_params)
+        if request_timeout:
+            params["request_timeout"] = request_timeout
+        if opts:
+            params.update(opts)
+        return params
+
+
 Username = Literal["root", "user"]
 """
 User used for the operation in the sandbox.
@@ -1,3 +1,39 @@
+import functools
+
+from typing import Tuple
+
 from packaging.version import Version
 
 ENVD_VERSION_RECURSIVE_WATCH = Version("0.1.4")
+ENVD_VERSION_MINIMUM = Version("0.1.0")
+
+# (release without trailing zeros, 0 before the release / 1 from the release on)
+_VersionKey = Tuple[Tuple[int, ...], int]
+
+
+def _version_key(version: Version) -> _VersionKey:
+    release = version.release
+    while len(release) > 1 and release[-1] == 0:
+        release = release[:-1]
+    # Pre-releases and dev releases come before their release, dev releases of
+    # a post-release after it.
+    before_release = version.pre is not None or (
+        version.dev is not None and version.post is None
+    )
+    return release, 0 if before_release else 1
+
+
+# Plain tuples of the thresholds, comparing those is much cheaper than going
+# through Version's comparison key.
+_ENVD_VERSION_RECURSIVE_WATCH_KEY = _version_key(ENVD_VERSION_RECURSIVE_WATCH)
+_ENVD_VERSION_MINIMUM_KEY = _version_key(ENVD_VERSION_MINIMUM)
+
+
+@functools.lru_cache(maxsize=64)
+def parse_envd_version(version: str) -> _VersionKey:
+    """
+    Comparison key of an envd version, it orders the same as `Version` against the release thresholds above.
+    """
+    # Sandboxes run a handful of distinct envd versions, parsing each one once
+    # avoids repeating the regex work in Version.
+    return _version_key(Version(version))
@@ -1,7 +1,7 @@
 import urllib.parse
 
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import ClassVar, Optional
 
 from agentbox.sandbox.signature import get_signature
 from agentbox.connection_config import ConnectionConfig
@@ -10,17 +10,23 @@ from httpx import Limits
 
 
 class SandboxSetup(ABC):
+    __slots__ = ()
+
+    # Limits for the envd connection pool shared by files, commands and pty.
+    # Override on a subclass to tune them for a deployment.
     _limits = Limits(
-        max_keepalive_connections=40,
-        max_connections=40,
+        max_keepalive_connections=100,
+        max_connections=1000,
         keepalive_expiry=300,
     )
 
-    envd_port = 49983
+    envd_port: ClassVar[int] = 49983
 
-    default_sandbox_timeout = 300
-    default_connect_timeout = 3600 # auto_pause后再次connect的默认timeout 单位：秒
-    default_template = "base"
+    default_sandbox_timeout: ClassVar[int] = 300
+    default_connect_timeout: ClassVar[int] = 3600 # auto_pause后再次connect的默认timeout 单位：秒
+    default_template: ClassVar[str] = "base"
+    # Cached instance auth info is refreshed this many seconds before it expires
+    auth_info_expiry_margin: ClassVar[int] = 60
 
     @property
     @abstractmethod
@@ -1,17 +1,144 @@
+import email.utils
+import random
+import sys
+import threading
+import time
+
 from abc import ABC
 from dataclasses import dataclass
-from typing import Optional, Dict
-from datetime import datetime
+from collections import OrderedDict
+from typing import Any, Optional, Dict, Mapping, Tuple
+from datetime import datetime, timezone
+
+from httpx import Limits, Proxy
+
+from agentbox.api.client.models import SandboxState, SandboxDetail
+from agentbox.api.client.models import ListedSandbox as ListedSandboxModel
+from agentbox.connection_config import ConnectionConfig, ProxyTypes
+
+
+def _str_or_none(value) -> Optional[str]:
+    # The generated models use the UNSET sentinel for missing fields, an exact
+    # class check rejects it without going through isinstance.
+    return value if value.__class__ is str else None
+
+
+def _proxy_key(proxy: Optional[ProxyTypes]) -> Any:
+    # `httpx.Proxy` and `httpx.URL` hash by identity, equal proxies passed as
+    # fresh objects must still map to one key.
+    if proxy is None:
+        return None
+    if not isinstance(proxy, Proxy):
+        proxy = Proxy(url=proxy)
+    elif proxy.ssl_context is not None:
+        # SSL contexts can't be compared, only the same proxy is reused
+        return proxy
+    return (str(proxy.url), proxy.auth, tuple(proxy.headers.multi_items()))
+
+
+# Responses worth retrying. Creating a sandbox is not idempotent, a gateway
+# error can come back after the sandbox was already created, so it is only
+# retried when the API rate limited the request.
+_RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+_RETRY_CREATE_STATUS_CODES = frozenset({429})
+_RETRY_ATTEMPTS = 3
+_RETRY_BASE_DELAY = 0.2  # seconds
+# Longer Retry-After waits are left to the caller
+_RETRY_MAX_DELAY = 10.0  # seconds
+
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _retry_delay(attempt: int, response=None) -> Optional[float]:
+    """
+    Seconds to wait before the next attempt, `None` when the response asks for a longer wait than is worth blocking on.
+    """
+    if response is not None:
+        retry_after = _retry_after(response.headers)
+        if retry_after is not None:
+            return retry_after if retry_after <= _RETRY_MAX_DELAY else None
+    # Exponential backoff with jitter, so concurrent creates don't retry in lockstep
+    return _RETRY_BASE_DELAY * 2**attempt * (0.5 + random.random())
+
+
+class _BrdDetailsCache:
+    """
+    SSH/ADB details of brd sandboxes, keyed by a tuple starting with the sandbox ID.
+
+    Back-to-back connects to the same sandbox reuse them for a few seconds. The
+    details can change when a sandbox is paused, resumed or killed, so those calls
+    drop its entries.
+    """
+
+    ttl = 5.0  # seconds
+    max_size = 32
+
+    def __init__(self) -> None:
+        self._entries: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] >= self.ttl:
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def set(self, key: tuple, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
 
-from httpx import Limits
+    def forget(self, sandbox_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == sandbox_id]:
+                del self._entries[key]
 
-from agentbox.api.client.models import SandboxState
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _metadata_dict(value) -> Dict[str, str]:
+    # A copy, so callers can change it without touching the model
+    return dict(value) if value.__class__ is dict else {}
 
 
 @dataclass
 class SandboxInfo:
     """Information about a sandbox."""
 
+    __slots__ = (
+        "sandbox_id",
+        "template_id",
+        "name",
+        "metadata",
+        "started_at",
+        "end_at",
+        "envd_version",
+        "_envd_access_token",
+    )
+
     sandbox_id: str
     """Sandbox ID."""
     template_id: str
@@ -29,10 +156,23 @@ class SandboxInfo:
     _envd_access_token: Optional[str]
     """Envd access token."""
 
+
 @dataclass
 class ListedSandbox:
     """Information about a sandbox."""
 
+    __slots__ = (
+        "sandbox_id",
+        "template_id",
+        "name",
+        "state",
+        "cpu_count",
+        "memory_mb",
+        "metadata",
+        "started_at",
+        "end_at",
+    )
+
     sandbox_id: str
     """Sandbox ID."""
     template_id: str
@@ -50,22 +190,75 @@ class ListedSandbox:
     started_at: datetime
     """Sandbox start time."""
     end_at: datetime
+    """Sandbox expiration date."""
 
-@dataclass
+
+@dataclass(init=False)
 class SandboxQuery:
     """Query parameters for listing sandboxes."""
 
-    metadata: Optional[dict[str, str]] = None
+    __slots__ = ("metadata",)
+
+    metadata: Optional[Dict[str, str]]
     """Filter sandboxes by metadata."""
 
+    # Written out, a class-level None default would conflict with __slots__
+    def __init__(self, metadata: Optional[Dict[str, str]] = None):
+        self.metadata = metadata
+
 
 class SandboxApiBase(ABC):
+    __slots__ = ()
+
+    # Limits for the control plane API client. Subclasses can override this to
+    # tune the pool; keepalive_expiry should outlast the usual idle gap between
+    # calls so the TCP/TLS handshake to the API host is not paid again.
     _limits = Limits(
-        max_keepalive_connections=10,
-        max_connections=20,
-        keepalive_expiry=20,
+        max_keepalive_connections=20,
+        max_connections=100,
+        keepalive_expiry=30,
     )
 
+    @staticmethod
+    def _get_api_client_key(config: ConnectionConfig) -> tuple:
+        # The API key and headers are sent per request and not part of the key
+        return (config.api_url, _proxy_key(config.proxy))
+
     @staticmethod
     def _get_sandbox_id(sandbox_id: str, client_id: str) -> str:
-        return f"{sandbox_id}-{client_id}"
+        return sandbox_id + "-" + client_id
+
+    @staticmethod
+    def _listed_sandbox_from_model(sandbox: ListedSandboxModel) -> ListedSandbox:
+        return ListedSandbox(
+            sandbox_id=SandboxApiBase._get_sandbox_id(
+                sandbox.sandbox_id,
+                sandbox.client_id,
+            ),
+            # Listed sandboxes mostly share a handful of templates, interning
+            # lets them all point at the same string.
+            template_id=sys.intern(sandbox.template_id),
+            name=_str_or_none(sandbox.alias),
+            metadata=_metadata_dict(sandbox.metadata),
+            state=sandbox.state,
+            cpu_count=sandbox.cpu_count,
+            memory_mb=sandbox.memory_mb,
+            started_at=sandbox.started_at,
+            end_at=sandbox.end_at,
+        )
+
+    @staticmethod
+    def _sandbox_info_from_detail(sandbox: SandboxDetail) -> SandboxInfo:
+        return SandboxInfo(
+            sandbox_id=SandboxApiBase._get_sandbox_id(
+                sandbox.sandbox_id,
+                sandbox.client_id,
+            ),
+            template_id=sandbox.template_id,
+            name=_str_or_none(sandbox.alias),
+            metadata=_metadata_dict(sandbox.metadata),
+            started_at=sandbox.started_at,
+            end_at=sandbox.end_at,
+            envd_version=_str_or_none(sandbox.envd_version),
+            _envd_access_token=_str_or_none(sandbox.envd_access_token),
+        )
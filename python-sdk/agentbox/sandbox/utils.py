@@ -1,9 +1,40 @@
-from typing import TypeVar, Any, cast, Optional, Type
+from typing import TypeVar, Any, cast, Optional, Tuple, Type
 import functools
+import types
+
+from agentbox.exceptions import SandboxException
 
 T = TypeVar("T")
 
 
+def parse_ssh_connect_command(connect_command: str) -> Tuple[int, str, str]:
+    """
+    Parse the port, username and host from an SSH connect command like `ssh -p 22 user@host`.
+    """
+    # The command is a short list of whitespace separated arguments, a split
+    # is enough and avoids the backtracking of a regex.
+    tokens = connect_command.split()
+    try:
+        port_index = tokens.index("-p", tokens.index("ssh") + 1) + 1
+        port = int(tokens[port_index])
+    except (ValueError, IndexError):
+        raise SandboxException("Could not parse SSH connection details")
+
+    for token in tokens[port_index + 1 :]:
+        username, _, host = token.partition("@")
+        if username and host:
+            return port, username, host
+
+    raise SandboxException("Could not parse SSH connection details")
+
+
+def is_brd_sandbox_id(sandbox_id: str) -> bool:
+    """
+    Check whether the sandbox is a brd sandbox, which is reached over SSH/ADB instead of envd.
+    """
+    return "brd" in sandbox_id.lower()
+
+
 class class_method_variant(object):
     def __init__(self, class_method_name):
         self.class_method_name = class_method_name
@@ -15,13 +46,14 @@ class class_method_variant(object):
         return cast(T, self)
 
     def __get__(self, obj, objtype: Optional[Type[Any]] = None):
+        if obj is not None:
+            # Accessed on an instance, e.g. instance.method(...), bind it
+            # directly so the call does not go through the dispatch below.
+            return types.MethodType(self.method, obj)
+
         @functools.wraps(self.method)
         def _wrapper(*args, **kwargs):
-            if obj is not None:
-                # Method was called as an instance method, e.g.
-                # instance.method(...)
-                return self.method(obj, *args, **kwargs)
-            elif len(args) > 0 and objtype is not None and isinstance(args[0], objtype):
+            if len(args) > 0 and objtype is not None and isinstance(args[0], objtype):
                 # Method was called as a class method with the instance as the
                 # first argument, e.g. Class.method(instance, ...) which in
                 # Python is the same thing as calling an instance method
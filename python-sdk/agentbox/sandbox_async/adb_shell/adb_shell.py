@@ -37,6 +37,8 @@ class ADBShell:
         self._device = None
         self.instance_no = None
         self._active = False
+        # 每层 with 块是否由自己打开了会话，退出时只关闭自己打开的
+        self._opened_by_with = []
 
     async def _adb_connect(self):
         """创建一个新的连接"""
@@ -121,16 +123,23 @@ class ADBShell:
         self._active = False
         await self._device.close()
 
+    async def __aenter__(self):
+        """连接并在 async with 块内复用同一个 ADB 会话"""
+        opened = not self._active
+        await self.connect()
+        self._opened_by_with.append(opened)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        if self._opened_by_with.pop():
+            await self.close()
+
 
     async def _get_adb_public_info(self):
         """获取adb连接信息"""
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-
         info = await SandboxApi._get_adb_public_info(
             sandbox_id = self.sandbox_id,
-            **config_dict,
+            **self.connection_config.get_api_params(),
             )
         self.host = info.adb_ip
         self.port = info.adb_port
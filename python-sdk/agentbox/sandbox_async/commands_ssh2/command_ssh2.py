@@ -13,29 +13,52 @@ from agentbox.sandbox_async.commands_ssh2.command_handle_ssh2 import SSHAsyncCom
 from agentbox.sandbox_async.utils import OutputHandler
 
 
-class SSHCommands2:
+class SSHConnection:
+    """
+    Lazily connected SSH client that can be shared by several `SSHCommands2` instances,
+    each command runs on its own channel over the same transport.
+    """
+
+    # Seconds between keepalive packets, so the connection survives idle periods
+    keepalive_interval = 30
+
     def __init__(
         self,
         ssh_host: str,
         ssh_port: int,
         ssh_username: str,
         ssh_password: str,
-        connection_config: ConnectionConfig,
     ) -> None:
         self._ssh_host = ssh_host
         self._ssh_port = ssh_port
         self._ssh_username = ssh_username
         self._ssh_password = ssh_password
-        self._connection_config = connection_config
         self._client = None
-        self._processes = {}
+        # Created on first use so it binds to the running event loop
+        self._lock: Optional[asyncio.Lock] = None
 
-    async def _get_ssh_client(self):
-        if self._client is None or not self._client.get_transport() or not self._client.get_transport().is_active():
-            self._client = paramiko.SSHClient()
-            self._client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    def _is_active(self) -> bool:
+        if self._client is None:
+            return False
+        transport = self._client.get_transport()
+        return transport is not None and transport.is_active()
+
+    async def get_client(self) -> paramiko.SSHClient:
+        if self._is_active():
+            return self._client
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            # Another caller may have connected while we were waiting
+            if self._is_active():
+                return self._client
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             connect_func = partial(
-                self._client.connect,
+                client.connect,
                 hostname=self._ssh_host,
                 port=self._ssh_port,
                 username=self._ssh_username,
@@ -48,8 +71,43 @@ class SSHCommands2:
             except Exception as e:
                 print("SSH 连接失败：", e)
                 raise
+            client.get_transport().set_keepalive(self.keepalive_interval)
+            self._client = client
+
         return self._client
 
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class SSHCommands2:
+    def __init__(
+        self,
+        ssh_host: str,
+        ssh_port: int,
+        ssh_username: str,
+        ssh_password: str,
+        connection_config: ConnectionConfig,
+        ssh_connection: Optional[SSHConnection] = None,
+    ) -> None:
+        self._ssh_host = ssh_host
+        self._ssh_port = ssh_port
+        self._ssh_username = ssh_username
+        self._ssh_password = ssh_password
+        self._connection_config = connection_config
+        self._ssh_connection = ssh_connection or SSHConnection(
+            ssh_host,
+            ssh_port,
+            ssh_username,
+            ssh_password,
+        )
+        self._processes = {}
+
+    async def _get_ssh_client(self):
+        return await self._ssh_connection.get_client()
+
     async def list(self, request_timeout: Optional[float] = None) -> List[ProcessInfo]:
         # ps -eo pid,comm,args --no-headers
         processes = []
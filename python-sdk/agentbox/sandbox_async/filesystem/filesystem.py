@@ -1,7 +1,6 @@
 import httpcore
 import httpx
 from io import IOBase
-from packaging.version import Version
 from typing import AsyncIterator, IO, List, Literal, Optional, overload, Union
 from agentbox.sandbox.filesystem.filesystem import WriteEntry
 import agentbox_connect as connect
@@ -14,7 +13,7 @@ from agentbox.connection_config import (
 from agentbox.envd.api import ENVD_API_FILES_ROUTE, ahandle_envd_api_exception
 from agentbox.envd.filesystem import filesystem_connect, filesystem_pb2
 from agentbox.envd.rpc import authentication_header, handle_rpc_exception
-from agentbox.envd.versions import ENVD_VERSION_RECURSIVE_WATCH
+from agentbox.envd.versions import _ENVD_VERSION_RECURSIVE_WATCH_KEY, parse_envd_version
 from agentbox.exceptions import SandboxException, TemplateException, InvalidArgumentException
 from agentbox.sandbox.filesystem.filesystem import EntryInfo, map_file_type
 from agentbox.sandbox.filesystem.watch_handle import FilesystemEvent
@@ -443,7 +442,7 @@ class Filesystem:
         if (
             recursive
             and self._envd_version is not None
-            and Version(self._envd_version) < ENVD_VERSION_RECURSIVE_WATCH
+            and parse_envd_version(self._envd_version) < _ENVD_VERSION_RECURSIVE_WATCH_KEY
         ):
             raise TemplateException(
                 "You need to update the template to use recursive watching. "
@@ -28,6 +28,9 @@ class SSHAsyncWatchHandle:
         self._on_exit = on_exit
         self._recursive = recursive
         self._running = True
+        # Polling keeps failing the same way, e.g. while the sandbox is paused,
+        # so an error is only printed once until the next successful poll
+        self._state_error_reported = False
 
         self._last_state: Dict[str, dict] = {}
         self._wait: Optional[asyncio.Task] = None
@@ -130,9 +133,12 @@ class SSHAsyncWatchHandle:
                 except ValueError:
                     continue
 
+            self._state_error_reported = False
             return current_state
         except Exception as e:
-            print(f"[get_file_state] Error: {e}")
+            if not self._state_error_reported:
+                self._state_error_reported = True
+                print(f"[get_file_state] Error: {e}")
             return {}
 
     # async def _detect_changes(self, old_state, new_state):
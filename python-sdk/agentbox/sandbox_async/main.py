@@ -1,41 +1,197 @@
+import asyncio
 import logging
+import time
 import httpx
-import re
-
-from typing import Dict, Optional, TypedDict, overload
+import weakref
+
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypedDict,
+    TypeVar,
+    Union,
+    overload,
+)
 from typing_extensions import Unpack, Self
 
-from agentbox.api.client.types import Unset
+from agentbox.api.client.types import UNSET, Unset
 from agentbox.connection_config import ConnectionConfig, ProxyTypes
 from agentbox.envd.api import ENVD_API_HEALTH_ROUTE, ahandle_envd_api_exception
 from agentbox.exceptions import format_request_timeout_error
 from agentbox.sandbox.main import SandboxSetup
-from agentbox.sandbox.utils import class_method_variant
+from agentbox.sandbox.utils import (
+    class_method_variant,
+    is_brd_sandbox_id,
+    parse_ssh_connect_command,
+)
 from agentbox.sandbox_async.adb_shell.adb_shell import ADBShell
 from agentbox.sandbox_async.filesystem.filesystem import Filesystem
 from agentbox.sandbox_async.commands.command import Commands
 from agentbox.sandbox_async.commands.pty import Pty
 from agentbox.sandbox_async.sandbox_api import SandboxApi, SandboxInfo
-from agentbox.api.client.models import SandboxADB, InstanceAuthInfo
+from agentbox.api.client.models import InstanceAuthInfo
 from agentbox.sandbox_async.filesystem_ssh.filesystem_ssh import SSHFilesystem
 from agentbox.sandbox_async.commands_ssh.command_ssh import SSHCommands
-from agentbox.sandbox_async.commands_ssh2.command_ssh2 import SSHCommands2
+from agentbox.sandbox_async.commands_ssh2.command_ssh2 import (
+    SSHCommands2,
+    SSHConnection,
+)
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 class AsyncTransportWithLogger(httpx.AsyncHTTPTransport):
+    # Only logs the request line and the status code. The response body must
+    # not be read here, file downloads and command output are streamed.
     async def handle_async_request(self, request):
-        url = f"{request.url.scheme}://{request.url.host}{request.url.path}"
-        logger.info(f"Request: {request.method} {url}")
-        response = await super().handle_async_request(request)
+        # Only format the log lines when they are going to be emitted
+        if not logger.isEnabledFor(logging.INFO):
+            return await super().handle_async_request(request)
 
-        # data = connect.GzipCompressor.decompress(response.read()).decode()
-        logger.info(f"Response: {response.status_code} {url}")
+        url = request.url
+        logger.info("Request: %s %s://%s%s", request.method, url.scheme, url.host, url.path)
+        response = await super().handle_async_request(request)
+        logger.info("Response: %s %s://%s%s", response.status_code, url.scheme, url.host, url.path)
 
         return response
 
 
+# Envd clients are shared by sandbox objects pointing at the same sandbox with
+# the same settings (e.g. repeated `connect()` calls), and the transports, which
+# own the connection pools, by all sandboxes with the same proxy and limits, so
+# pooled connections are reused across sandboxes. httpx clients and transports
+# are bound to the event loop they are used in, so both are kept per loop, and
+# only for as long as a sandbox object still references them.
+_envd_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, weakref.WeakValueDictionary[tuple, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+_envd_transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, weakref.WeakValueDictionary[tuple, AsyncTransportWithLogger]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _create_envd_transport(
+    proxy: Optional[ProxyTypes],
+    limits: httpx.Limits,
+) -> AsyncTransportWithLogger:
+    # envd negotiates HTTP/2 over ALPN when it supports it, so the
+    # filesystem, commands and pty calls can share one connection.
+    return AsyncTransportWithLogger(limits=limits, proxy=proxy, http2=True)
+
+
+def _get_shared_envd_api(
+    envd_api_url: str,
+    connection_config: ConnectionConfig,
+    limits: httpx.Limits,
+) -> httpx.AsyncClient:
+    proxy = connection_config.proxy
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Constructed outside of a coroutine, there is no loop to share it in
+        return httpx.AsyncClient(
+            base_url=envd_api_url,
+            transport=_create_envd_transport(proxy, limits),
+            headers=connection_config.headers,
+        )
+
+    envd_clients = _envd_clients.get(loop)
+    if envd_clients is None:
+        envd_clients = _envd_clients[loop] = weakref.WeakValueDictionary()
+
+    key = (
+        envd_api_url,
+        proxy,
+        tuple(sorted(connection_config.headers.items())),
+    )
+    envd_api = envd_clients.get(key)
+    if envd_api is not None:
+        return envd_api
+
+    envd_transports = _envd_transports.get(loop)
+    if envd_transports is None:
+        envd_transports = _envd_transports[loop] = weakref.WeakValueDictionary()
+
+    # httpx.Limits is not hashable
+    transport_key = (
+        proxy,
+        limits.max_connections,
+        limits.max_keepalive_connections,
+        limits.keepalive_expiry,
+    )
+    transport = envd_transports.get(transport_key)
+    if transport is None:
+        transport = envd_transports[transport_key] = _create_envd_transport(
+            proxy, limits
+        )
+
+    envd_api = envd_clients[key] = httpx.AsyncClient(
+        base_url=envd_api_url,
+        transport=transport,
+        headers=connection_config.headers,
+    )
+    return envd_api
+
+
+class _WarmPool:
+    """
+    Idle sandboxes kept by `AsyncSandbox.ensure_warm()` for one template, with the `beta_create()` options used to refill them.
+    """
+
+    __slots__ = ("opts", "sandboxes", "pending")
+
+    # Pooled sandboxes this close to their timeout are not handed out anymore
+    expiry_margin = 30  # seconds
+
+    def __init__(self, opts: Dict[str, Any]):
+        self.opts = opts
+        # (monotonic time the sandbox was requested, sandbox), oldest first
+        self.sandboxes: List[Tuple[float, "AsyncSandbox"]] = []
+        # Sandboxes being created for the pool, by `ensure_warm()` or refills
+        self.pending = 0
+
+    def __len__(self) -> int:
+        return len(self.sandboxes)
+
+    def add(self, requested_at: float, sandboxes: List["AsyncSandbox"]) -> None:
+        self.sandboxes.extend((requested_at, sandbox) for sandbox in sandboxes)
+
+    def take(
+        self, timeout: int
+    ) -> Tuple[Optional["AsyncSandbox"], List["AsyncSandbox"]]:
+        """
+        Remove the oldest sandbox that is not about to time out, and the ones that are.
+        """
+        expires_before = time.monotonic() - timeout + self.expiry_margin
+        expired = []
+        while self.sandboxes:
+            requested_at, sandbox = self.sandboxes.pop(0)
+            if requested_at > expires_before:
+                return sandbox, expired
+            expired.append(sandbox)
+        return None, expired
+
+
+# Warm pools keyed by sandbox class and template. The sandboxes use the API and
+# envd clients of the event loop they were created in, so pools are kept per loop.
+_warm_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[type, str], _WarmPool]]" = (
+    weakref.WeakKeyDictionary()
+)
+# Running refill tasks, the event loop only keeps weak references to tasks
+_warm_pool_tasks: "Set[asyncio.Future[None]]" = set()
+
+
 class AsyncSandboxOpts(TypedDict):
     sandbox_id: str
     envd_version: Optional[str]
@@ -75,11 +231,51 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
     ```
     """
 
+    # Sandboxes are often kept around in large numbers, slots keep them small.
+    # Only the attributes used by the sandbox kind (brd or envd) are set.
+    __slots__ = (
+        "_sandbox_id",
+        "_connection_config",
+        "_ssh_host",
+        "_ssh_port",
+        "_ssh_username",
+        "_ssh_password",
+        "_adb_auth_command",
+        "_adb_auth_password",
+        "_adb_connect_command",
+        "_adb_forwarder_command",
+        "_envd_api_url",
+        "_envd_version",
+        "_envd_access_token",
+        "_default_request_timeout",
+        "_is_brd",
+        "_ssh_connection",
+        "_commands",
+        "_watch_commands",
+        "_filesystem",
+        "_adb_shell",
+        "_envd_api",
+        "_pty",
+        "_instance_no",
+        "_auth_info_cache",
+        "_inflight",
+        "__weakref__",
+    )
+
     @property
     def files(self) -> Filesystem:
         """
         Module for interacting with the sandbox filesystem.
         """
+        if self._filesystem is None:
+            envd_api = self._get_envd_api()
+            self._filesystem = Filesystem(
+                self.envd_api_url,
+                self._envd_version,
+                self.connection_config,
+                envd_api._transport._pool,
+                envd_api,
+            )
         return self._filesystem
 
     @property
@@ -87,6 +283,12 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
         """
         Module for running commands in the sandbox.
         """
+        if self._commands is None:
+            self._commands = Commands(
+                self.envd_api_url,
+                self.connection_config,
+                self._get_envd_api()._transport._pool,
+            )
         return self._commands
 
     @property
@@ -94,6 +296,12 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
         """
         Module for interacting with the sandbox pseudo-terminal.
         """
+        if self._pty is None:
+            self._pty = Pty(
+                self.envd_api_url,
+                self.connection_config,
+                self._get_envd_api()._transport._pool,
+            )
         return self._pty
 
     @property
@@ -105,6 +313,11 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
 
     @property
     def envd_api_url(self) -> str:
+        # brd sandboxes are reached over SSH and never need it, so it is only
+        # built when asked for.
+        if self._envd_api_url is None:
+            scheme = "http" if self._connection_config.debug else "https"
+            self._envd_api_url = f"{scheme}://{self.get_host(self.envd_port)}"
         return self._envd_api_url
 
     @property
@@ -114,16 +327,6 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
         """
         return self._adb_shell
 
-    @property
-    def _envd_access_token(self) -> str:
-        """Private property to access the envd token"""
-        return self.__envd_access_token
-
-    @_envd_access_token.setter
-    def _envd_access_token(self, value: str):
-        """Private setter for envd token"""
-        self.__envd_access_token = value
-
     # @property
     # def envd_version(self) -> str:
     #     return self._envd_version
@@ -143,6 +346,9 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
 
         self._sandbox_id = opts["sandbox_id"]
         self._connection_config = opts["connection_config"]
+        self._instance_no: Optional[str] = None
+        self._auth_info_cache: Dict[int, Tuple[float, InstanceAuthInfo]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
         # Optional fields
         self._ssh_host = opts.get("ssh_host")
         self._ssh_port = opts.get("ssh_port")
@@ -153,12 +359,16 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
         self._adb_connect_command = opts.get("adb_connect_command")
         self._adb_forwarder_command = opts.get("adb_forwarder_command")
 
-        self._envd_api_url = f"{'http' if self.connection_config.debug else 'https'}://{self.get_host(self.envd_port)}"
+        self._envd_api_url: Optional[str] = None
         self._envd_version = opts.get("envd_version")
         self._envd_access_token = opts.get("envd_access_token")
+        # Resolved once, is_running is often polled without an explicit timeout
+        self._default_request_timeout = self._connection_config.get_request_timeout()
+
+        self._is_brd = is_brd_sandbox_id(self._sandbox_id)
 
         # 根据 sandbox id 进行区分 commands 类型
-        if "brd" in self._sandbox_id.lower():
+        if self._is_brd:
             # self._commands = SSHCommands(
             #     self._ssh_host,
             #     self._ssh_port,
@@ -166,12 +376,20 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
             #     self._ssh_password,
             #     self.connection_config,
             # )
+            # Both command modules multiplex their channels over one SSH connection
+            self._ssh_connection = SSHConnection(
+                self._ssh_host,
+                self._ssh_port,
+                self._ssh_username,
+                self._ssh_password,
+            )
             self._commands = SSHCommands2(
                 self._ssh_host,
                 self._ssh_port,
                 self._ssh_username,
                 self._ssh_password,
                 self.connection_config,
+                self._ssh_connection,
             )
             # self._watch_commands = SSHCommands(
             #     self._ssh_host,
@@ -186,6 +404,7 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
                 self._ssh_username,
                 self._ssh_password,
                 self.connection_config,
+                self._ssh_connection,
             )
             self._filesystem = SSHFilesystem(
                 self._ssh_host,
@@ -201,32 +420,19 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
                 sandbox_id=self._sandbox_id
             )
         else:
-            self._transport = AsyncTransportWithLogger(
-                limits=self._limits, proxy=self._connection_config.proxy
-            )
-            self._envd_api = httpx.AsyncClient(
-                base_url=self.envd_api_url,
-                transport=self._transport,
-                headers=self._connection_config.headers,
-            )
-
-            self._filesystem = Filesystem(
-                self.envd_api_url,
-                self._envd_version,
-                self.connection_config,
-                self._transport._pool,
-                self._envd_api,
-            )
-            self._commands = Commands(
-                self.envd_api_url,
-                self.connection_config,
-                self._transport._pool,
-            )
-            self._pty = Pty(
-                self.envd_api_url,
-                self.connection_config,
-                self._transport._pool,
+            # The envd client and the modules are built on first access, most
+            # callers only use some of them.
+            self._envd_api: Optional[httpx.AsyncClient] = None
+            self._filesystem = None
+            self._commands = None
+            self._pty = None
+
+    def _get_envd_api(self) -> httpx.AsyncClient:
+        if self._envd_api is None:
+            self._envd_api = _get_shared_envd_api(
+                self.envd_api_url, self._connection_config, self._limits
             )
+        return self._envd_api
 
     async def is_running(self, request_timeout: Optional[float] = None) -> bool:
         """
@@ -245,10 +451,19 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
         await sandbox.is_running() # Returns False
         ```
         """
+        timeout = (
+            self._default_request_timeout
+            if request_timeout is None
+            else self.connection_config.get_request_timeout(request_timeout)
+        )
+
+        if self._is_brd:
+            return await self._is_ssh_reachable(timeout)
+
         try:
-            r = await self._envd_api.get(
+            r = await self._get_envd_api().get(
                 ENVD_API_HEALTH_ROUTE,
-                timeout=self.connection_config.get_request_timeout(request_timeout),
+                timeout=timeout,
             )
 
             if r.status_code == 502:
@@ -264,6 +479,67 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
 
         return True
 
+    async def _is_ssh_reachable(self, timeout: Optional[float]) -> bool:
+        # brd sandboxes have no envd, a TCP connect to their SSH port is the
+        # cheapest check that the sandbox is still up.
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(self._ssh_host, self._ssh_port),
+                timeout=timeout,
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+    @classmethod
+    async def are_running(
+        cls,
+        sandboxes: Iterable["AsyncSandbox"],
+        request_timeout: Optional[float] = None,
+    ) -> Dict[str, bool]:
+        """
+        Check if the sandboxes are running.
+
+        The health checks are sent concurrently, sandboxes on the same event loop share their envd clients.
+
+        :param sandboxes: Sandboxes to check
+        :param request_timeout: Timeout for each request in **seconds**
+
+        :return: Mapping of sandbox IDs to `True` if the sandbox is running, `False` otherwise
+        """
+        sandboxes = list(sandboxes)
+        results = await asyncio.gather(
+            *(sandbox.is_running(request_timeout=request_timeout) for sandbox in sandboxes)
+        )
+        return {sandbox.sandbox_id: running for sandbox, running in zip(sandboxes, results)}
+
+    @classmethod
+    def _create_debug(
+        cls,
+        api_key: Optional[str] = None,
+        domain: Optional[str] = None,
+        request_timeout: Optional[float] = None,
+        proxy: Optional[ProxyTypes] = None,
+    ) -> Self:
+        return cls(
+            sandbox_id="debug_sandbox_id",
+            envd_version=None,
+            envd_access_token=None,
+            connection_config=ConnectionConfig(
+                api_key=api_key,
+                domain=domain,
+                debug=True,
+                request_timeout=request_timeout,
+                proxy=proxy,
+            ),
+        )
+
     @classmethod
     async def create(
         cls,
@@ -298,47 +574,36 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
         Use this method instead of using the constructor to create a new sandbox.
         """
 
-        connection_headers = {}
-
         if debug:
-            sandbox_id = "debug_sandbox_id"
-            envd_version = None
-            envd_access_token = None
-            ssh_host = "127.0.0.1"
-            ssh_port = 22
-            ssh_username = "debug"
-            ssh_password = "debug"
-            adb_info = SandboxADB(
-                adb_auth_command="adb shell",
-                auth_password="debug",
-                connect_command="adb connect 127.0.0.1",
-                expire_time="",
-                forwarder_command="",
-                instance_no="debug_sandbox_id"
-            )
-        else:
-            response = await SandboxApi._create_sandbox(
-                template=template or cls.default_template,
+            return cls._create_debug(
                 api_key=api_key,
-                timeout=timeout or cls.default_sandbox_timeout,
-                metadata=metadata,
                 domain=domain,
-                debug=debug,
                 request_timeout=request_timeout,
-                env_vars=envs,
-                secure=secure,
                 proxy=proxy,
-                auto_pause=auto_pause,
             )
 
-            sandbox_id = response.sandbox_id
-            envd_version = response.envd_version
-            envd_access_token = response.envd_access_token
+        response = await SandboxApi._create_sandbox(
+            template=template or cls.default_template,
+            api_key=api_key,
+            timeout=timeout or cls.default_sandbox_timeout,
+            metadata=metadata,
+            domain=domain,
+            debug=debug,
+            request_timeout=request_timeout,
+            env_vars=envs,
+            secure=secure,
+            proxy=proxy,
+            auto_pause=auto_pause,
+        )
+
+        connection_headers = None
+        sandbox_id = response.sandbox_id
+        envd_version = response.envd_version
+        envd_access_token = response.envd_access_token
 
-            if envd_access_token is not None and not isinstance(
-                envd_access_token, Unset
-            ):
-                connection_headers["X-Access-Token"] = envd_access_token
+        # SandboxApi has already turned a missing token into None
+        if envd_access_token is not None:
+            connection_headers = {"X-Access-Token": envd_access_token}
 
         connection_config = ConnectionConfig(
             api_key=api_key,
@@ -349,49 +614,18 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
             proxy=proxy,
         )
 
-        if "brd" in sandbox_id.lower():
-            # Get SSH connection details
-            ssh_info = await SandboxApi._get_ssh(
+        if is_brd_sandbox_id(sandbox_id):
+            return await cls._cls_connect_brd(
                 sandbox_id=sandbox_id,
+                connection_config=connection_config,
+                envd_version=envd_version,
+                envd_access_token=envd_access_token,
                 api_key=api_key,
                 domain=domain,
                 debug=debug,
                 request_timeout=request_timeout,
                 proxy=proxy,
             )
-
-            # Parse SSH connection details from the connect command
-            pattern = r'ssh\s+-p\s+(\d+).*?\s+([^@\s]+)@([\w\.-]+)'
-            ssh_match = re.search(pattern, ssh_info.connect_command)
-            if ssh_match:
-                ssh_port = int(ssh_match.group(1))
-                ssh_username = ssh_match.group(2)
-                ssh_host = ssh_match.group(3)
-                ssh_password = ssh_info.auth_password
-            else:
-                raise Exception("Could not parse SSH connection details")
-            # Get adb connection details
-            adb_info = await SandboxApi._get_adb(
-                sandbox_id=sandbox_id,
-                api_key=api_key,
-                domain=domain,
-                debug=debug,
-                proxy=proxy,
-            )
-            return cls(
-                sandbox_id=sandbox_id,
-                envd_version=envd_version,
-                envd_access_token=envd_access_token,
-                connection_config=connection_config,
-                ssh_host=ssh_host,
-                ssh_port=ssh_port,
-                ssh_username=ssh_username,
-                ssh_password=ssh_password,
-                adb_auth_command=adb_info.adb_auth_command,
-                adb_auth_password=adb_info.auth_password,
-                adb_connect_command=adb_info.connect_command,
-                adb_forwarder_command=adb_info.forwarder_command
-            )
         else:
             return cls(
                 sandbox_id=sandbox_id,
@@ -444,16 +678,11 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
         self,
         request_timeout: Optional[float] = None,
     ) -> bool:  # type: ignore
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
-
         return await SandboxApi._cls_kill(
             sandbox_id=self.sandbox_id,
-            **config_dict,
+            **self.connection_config.get_api_params(
+                request_timeout=request_timeout
+            ),
         )
 
     @overload
@@ -505,17 +734,12 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
         timeout: int,
         request_timeout: Optional[float] = None,
     ) -> None:
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
-
         await SandboxApi._cls_set_timeout(
             sandbox_id=self.sandbox_id,
             timeout=timeout,
-            **config_dict,
+            **self.connection_config.get_api_params(
+                request_timeout=request_timeout
+            ),
         )
 
     @classmethod
@@ -555,69 +779,32 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
             debug=debug,
         )
 
-        connection_headers = {}
-        response = await SandboxApi.get_info(sandbox_id=sandbox_id, api_key=api_key, domain=domain, debug=debug)
-        if response._envd_access_token is not None and not isinstance(
-            response._envd_access_token, Unset
-        ):
-            connection_headers["X-Access-Token"] = response._envd_access_token
-
-        connection_config = ConnectionConfig(
-            api_key=api_key,
-            domain=domain,
-            debug=debug,
-            headers=connection_headers,
-        )
-
-        if "brd" in sandbox_id.lower():
-            # Get SSH connection details
-            ssh_info = await SandboxApi._get_ssh(
+        if is_brd_sandbox_id(sandbox_id):
+            return await cls._cls_connect_brd(
                 sandbox_id=sandbox_id,
+                connection_config=ConnectionConfig(
+                    api_key=api_key,
+                    domain=domain,
+                    debug=debug,
+                ),
+                with_info=True,
                 api_key=api_key,
                 domain=domain,
                 debug=debug,
                 request_timeout=request_timeout,
             )
 
-            # Parse SSH connection details from the connect command
-            pattern = r'ssh\s+-p\s+(\d+).*?\s+([^@\s]+)@([\w\.-]+)'
-            ssh_match = re.search(pattern, ssh_info.connect_command)
-            if ssh_match:
-                ssh_port = int(ssh_match.group(1))
-                ssh_username = ssh_match.group(2)
-                ssh_host = ssh_match.group(3)
-                ssh_password = ssh_info.auth_password
-            else:
-                raise Exception("Could not parse SSH connection details")
-            # Get adb connection details
-            adb_info = await SandboxApi._get_adb(
-                sandbox_id=sandbox_id,
+        response = await SandboxApi.get_info(sandbox_id=sandbox_id, api_key=api_key, domain=domain, debug=debug)
+        return cls._cls_from_envd(
+            sandbox_id=sandbox_id,
+            connection_config=ConnectionConfig(
                 api_key=api_key,
                 domain=domain,
                 debug=debug,
-            )
-            return cls(
-                sandbox_id=sandbox_id,
-                envd_version=response.envd_version,
-                envd_access_token=response._envd_access_token,
-                connection_config=connection_config,
-                ssh_host=ssh_host,
-                ssh_port=ssh_port,
-                ssh_username=ssh_username,
-                ssh_password=ssh_password,
-                adb_auth_command=adb_info.adb_auth_command,
-                adb_auth_password=adb_info.auth_password,
-                adb_connect_command=adb_info.connect_command,
-                adb_forwarder_command=adb_info.forwarder_command
-            )
-        else:
-            return cls(
-                sandbox_id=sandbox_id,
-                envd_version=response.envd_version,
-                envd_access_token=response._envd_access_token,
-                connection_config=connection_config,
-                commands=cls.commands
-            )
+            ),
+            envd_version=response.envd_version,
+            envd_access_token=response._envd_access_token,
+        )
 
     @overload
     async def pause(
@@ -686,62 +873,107 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
         :return: Sandbox info
         """
 
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
-
         return await SandboxApi.get_info(
             sandbox_id=self.sandbox_id,
-            **config_dict,
+            **self.connection_config.get_api_params(
+                request_timeout=request_timeout
+            ),
         )
 
+    async def _single_flight(
+        self,
+        key: Hashable,
+        request: Callable[[], Awaitable[T]],
+    ) -> T:
+        # Concurrent callers asking for the same thing share one request
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(request())
+
+            def forget(done: "asyncio.Future[T]") -> None:
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+            task.add_done_callback(forget)
+
+        # A caller being cancelled must not cancel the request for the others
+        return await asyncio.shield(task)
+
     async def get_instance_no(  # type: ignore
         self,
         request_timeout: Optional[float] = None,
     ) -> str:
         """
         Get sandbox instance number.
+
+        The instance number does not change for the lifetime of the sandbox, it is only requested once.
+
         :param request_timeout: Timeout for the request in **seconds**
         :return: Sandbox instance number
         """
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
+        if self._instance_no is None:
+            self._instance_no = await self._single_flight(
+                "instance_no",
+                lambda: SandboxApi.get_instance_no(
+                    sandbox_id=self.sandbox_id,
+                    **self.connection_config.get_api_params(
+                        request_timeout=request_timeout
+                    ),
+                ),
+            )
+        return self._instance_no
 
-        return await SandboxApi.get_instance_no(
-            sandbox_id=self.sandbox_id,
-            **config_dict,
-        )
-    
     async def get_instance_auth_info(  # type: ignore
         self,
         valid_time: Optional[int] = None,
         request_timeout: Optional[float] = None,
+        use_cache: bool = False,
     ) -> InstanceAuthInfo:
         """
         Get sandbox instance auth info.
+
+        :param valid_time: How long the auth info should be valid for in **seconds**
         :param request_timeout: Timeout for the request in **seconds**
+        :param use_cache: Reuse auth info requested earlier by this sandbox object with the same `valid_time` until shortly before it expires, use `clear_auth_cache()` to drop it
         :return: Sandbox instance auth info
         """
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
+        if use_cache and valid_time:
+            cached = self._auth_info_cache.get(valid_time)
+            if cached is not None and time.monotonic() < cached[0]:
+                return cached[1]
+
+            return await self._single_flight(
+                ("auth_info", valid_time),
+                lambda: self._request_instance_auth_info(valid_time, request_timeout),
+            )
 
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
+        return await self._request_instance_auth_info(valid_time, request_timeout)
 
-        return await SandboxApi.get_instance_auth_info(
+    async def _request_instance_auth_info(
+        self,
+        valid_time: Optional[int],
+        request_timeout: Optional[float],
+    ) -> InstanceAuthInfo:
+        requested_at = time.monotonic()
+        auth_info = await SandboxApi.get_instance_auth_info(
             sandbox_id=self.sandbox_id,
             valid_time=valid_time,
-            **config_dict,
+            **self.connection_config.get_api_params(
+                request_timeout=request_timeout
+            ),
         )
 
+        if valid_time:
+            expires_at = requested_at + valid_time - self.auth_info_expiry_margin
+            self._auth_info_cache[valid_time] = (expires_at, auth_info)
+        return auth_info
+
+    def clear_auth_cache(self) -> None:
+        """
+        Drop the cached instance auth info, the next `get_instance_auth_info()` call requests a new one.
+        """
+        self._auth_info_cache.clear()
+
     @overload
     async def connect(
         self,
@@ -842,18 +1074,17 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
         same_sandbox = sandbox.connect()
         ```
         """
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-        config_dict.pop("headers", None)
-
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
+        # connect() does not take the envd headers, those come from the
+        # connect response
+        api_params = dict(
+            self.connection_config.get_api_params(request_timeout=request_timeout)
+        )
+        del api_params["headers"]
 
         return await self.__class__._cls_connect(
             sandbox_id=self.sandbox_id,
             timeout=timeout,
-            **config_dict,
+            **api_params,
         )
 
     @classmethod
@@ -875,74 +1106,110 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
             request_timeout=request_timeout,
             proxy=proxy,
         )
-        if "brd" in sandbox_id.lower():
-            ssh_info = await SandboxApi._get_ssh(
-                sandbox_id=sandbox_id,
-                api_key=api_key,
-                domain=domain,
-                debug=debug,
-                request_timeout=request_timeout,
-                proxy=proxy,
-            )
-            pattern = r'ssh\s+-p\s+(\d+).*?\s+([^@\s]+)@([\w\.-]+)'
-            ssh_match = re.search(pattern, ssh_info.connect_command)
-            if ssh_match:
-                ssh_port = int(ssh_match.group(1))
-                ssh_username = ssh_match.group(2)
-                ssh_host = ssh_match.group(3)
-                ssh_password = ssh_info.auth_password
-            else:
-                raise Exception("Could not parse SSH connection details")
-            adb_info = await SandboxApi._get_adb(
+        if is_brd_sandbox_id(sandbox_id):
+            return await cls._cls_connect_brd(
                 sandbox_id=sandbox_id,
+                connection_config=connection_config,
                 api_key=api_key,
                 domain=domain,
                 debug=debug,
                 request_timeout=request_timeout,
                 proxy=proxy,
             )
-            return cls(
-                sandbox_id=sandbox_id,
-                connection_config=connection_config,
-                ssh_host=ssh_host,
-                ssh_port=ssh_port,
-                ssh_username=ssh_username,
-                ssh_password=ssh_password,
-                adb_auth_command=adb_info.adb_auth_command,
-                adb_auth_password=adb_info.auth_password,
-                adb_connect_command=adb_info.connect_command,
-                adb_forwarder_command=adb_info.forwarder_command
-            )
         else:
             timeout = timeout or cls.default_connect_timeout
-            await SandboxApi._cls_connect(
+            # The connect response already carries the envd version and access
+            # token, so no separate get_info round trip is needed.
+            sandbox = await SandboxApi._cls_connect(
                 sandbox_id=sandbox_id,
                 timeout=timeout,
                 api_key=api_key,
                 domain=domain,
                 debug=debug,
                 request_timeout=request_timeout,
+                proxy=proxy,
             )
 
-            connection_headers = {}
-            response = await SandboxApi.get_info(
+            return cls._cls_from_envd(
                 sandbox_id=sandbox_id,
-                api_key=api_key,
-                domain=domain,
-                debug=debug,
-                request_timeout=request_timeout,
-            )
-            envd_access_token = response._envd_access_token
-            if envd_access_token is not None and not isinstance(envd_access_token, Unset):
-                connection_headers["X-Access-Token"] = envd_access_token
-            connection_config.headers = connection_headers
-            return cls(
-                sandbox_id=sandbox_id,
-                envd_version=response.envd_version,
-                envd_access_token=envd_access_token,
                 connection_config=connection_config,
+                envd_version=sandbox.envd_version,
+                envd_access_token=sandbox.envd_access_token,
             )
-    
+
+    @classmethod
+    def _cls_from_envd(
+        cls,
+        sandbox_id: str,
+        connection_config: ConnectionConfig,
+        envd_version: Optional[str],
+        envd_access_token: Union[Optional[str], Unset],
+    ) -> Self:
+        if envd_access_token is UNSET:
+            envd_access_token = None
+        if envd_access_token is not None:
+            connection_config.headers = {"X-Access-Token": envd_access_token}
+
+        return cls(
+            sandbox_id=sandbox_id,
+            envd_version=envd_version,
+            envd_access_token=envd_access_token,
+            connection_config=connection_config,
+        )
+
+    @classmethod
+    async def _cls_connect_brd(
+        cls,
+        sandbox_id: str,
+        connection_config: ConnectionConfig,
+        with_info: bool = False,
+        envd_version: Optional[str] = None,
+        envd_access_token: Optional[str] = None,
+        api_key: Optional[str] = None,
+        domain: Optional[str] = None,
+        debug: Optional[bool] = None,
+        request_timeout: Optional[float] = None,
+        proxy: Optional[ProxyTypes] = None,
+    ) -> Self:
+        api_params = dict(
+            sandbox_id=sandbox_id,
+            api_key=api_key,
+            domain=domain,
+            debug=debug,
+            request_timeout=request_timeout,
+            proxy=proxy,
+        )
+
+        # The SSH/ADB and sandbox info lookups are independent of each other
+        requests = [SandboxApi._get_brd_details(**api_params)]
+        if with_info:
+            requests.append(SandboxApi.get_info(**api_params))
+        (ssh_info, adb_info), *info = await asyncio.gather(*requests)
+
+        if info:
+            envd_version = info[0].envd_version
+            envd_access_token = info[0]._envd_access_token
+            if envd_access_token is not None:
+                connection_config.headers = {"X-Access-Token": envd_access_token}
+
+        ssh_port, ssh_username, ssh_host = parse_ssh_connect_command(
+            ssh_info.connect_command
+        )
+        return cls(
+            sandbox_id=sandbox_id,
+            envd_version=envd_version,
+            envd_access_token=envd_access_token,
+            connection_config=connection_config,
+            ssh_host=ssh_host,
+            ssh_port=ssh_port,
+            ssh_username=ssh_username,
+            ssh_password=ssh_info.auth_password,
+            adb_auth_command=adb_info.adb_auth_command,
+            adb_auth_password=adb_info.auth_password,
+            adb_connect_command=adb_info.connect_command,
+            adb_forwarder_command=adb_info.forwarder_command
+        )
+
     @classmethod
     async def beta_create(
         cls,
@@ -995,6 +1262,239 @@ class AsyncSandbox(SandboxSetup, SandboxApi):
             auto_pause=auto_pause,
         )
 
+    @classmethod
+    async def beta_create_many(
+        cls,
+        count: int,
+        template: Optional[str] = None,
+        timeout: Optional[int] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        envs: Optional[Dict[str, str]] = None,
+        api_key: Optional[str] = None,
+        domain: Optional[str] = None,
+        debug: Optional[bool] = None,
+        request_timeout: Optional[float] = None,
+        proxy: Optional[ProxyTypes] = None,
+        secure: Optional[bool] = None,
+        auto_pause: bool = False,
+    ) -> List[Self]:
+        """
+        [BETA] This feature is in beta and may change in the future.
+
+        Create several sandboxes with the same settings.
+
+        The sandboxes are created concurrently over the shared API connection pool.
+        If any of them fails to be created, the ones that were created are killed and the error is raised.
+
+        :param count: Number of sandboxes to create
+
+        The other parameters are the same as for `beta_create()`.
+
+        :return: A list of Sandbox instances for the new sandboxes
+        """
+        results = await asyncio.gather(
+            *(
+                cls.beta_create(
+                    template=template,
+                    timeout=timeout,
+                    metadata=metadata,
+                    envs=envs,
+                    api_key=api_key,
+                    domain=domain,
+                    debug=debug,
+                    request_timeout=request_timeout,
+                    proxy=proxy,
+                    secure=secure,
+                    auto_pause=auto_pause,
+                )
+                for _ in range(count)
+            ),
+            return_exceptions=True,
+        )
+
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await asyncio.gather(
+                *(
+                    result.kill()
+                    for result in results
+                    if not isinstance(result, BaseException)
+                ),
+                return_exceptions=True,
+            )
+            raise errors[0]
+
+        return results
+
+    @classmethod
+    async def ensure_warm(
+        cls,
+        size: int,
+        template: Optional[str] = None,
+        timeout: Optional[int] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        envs: Optional[Dict[str, str]] = None,
+        api_key: Optional[str] = None,
+        domain: Optional[str] = None,
+        debug: Optional[bool] = None,
+        request_timeout: Optional[float] = None,
+        proxy: Optional[ProxyTypes] = None,
+        secure: Optional[bool] = None,
+        auto_pause: bool = False,
+    ) -> None:
+        """
+        [BETA] This feature is in beta and may change in the future.
+
+        Keep idle sandboxes from the template ready to be handed out by `beta_create_from_pool()`.
+
+        Waits until the pool holds `size` sandboxes. The options are remembered and used to replace the sandboxes taken from the pool.
+        The `timeout` of a pooled sandbox is restarted when it is handed out, sandboxes that are about to time out in the pool are replaced.
+        Pools belong to the running event loop.
+
+        :param size: Number of idle sandboxes to keep
+
+        The other parameters are the same as for `beta_create()`.
+        """
+        template = template or cls.default_template
+        opts: Dict[str, Any] = dict(
+            template=template,
+            timeout=timeout,
+            metadata=metadata,
+            envs=envs,
+            api_key=api_key,
+            domain=domain,
+            debug=debug,
+            request_timeout=request_timeout,
+            proxy=proxy,
+            secure=secure,
+            auto_pause=auto_pause,
+        )
+
+        pools = _warm_pools.setdefault(asyncio.get_running_loop(), {})
+        key = (cls, template)
+        pool = pools.get(key)
+        if pool is None:
+            pool = pools[key] = _WarmPool(opts)
+        else:
+            # Updated in place, refills in flight still belong to this pool
+            pool.opts = opts
+
+        # Creations in flight count too, concurrent calls must not overfill
+        missing = size - len(pool) - pool.pending
+        if missing > 0:
+            requested_at = time.monotonic()
+            pool.pending += missing
+            try:
+                sandboxes = await cls.beta_create_many(missing, **opts)
+            finally:
+                pool.pending -= missing
+            pool.add(requested_at, sandboxes)
+
+    @classmethod
+    async def beta_create_from_pool(cls, template: Optional[str] = None) -> Self:
+        """
+        [BETA] This feature is in beta and may change in the future.
+
+        Take an idle sandbox prepared by `ensure_warm()`, a replacement is created in the background.
+
+        When the pool is empty a new sandbox is created with the pool's options,
+        or with the default options if `ensure_warm()` was not called for the template.
+
+        :param template: Sandbox template name or ID
+
+        :return: A Sandbox instance
+        """
+        key = (cls, template or cls.default_template)
+        pool = _warm_pools.get(asyncio.get_running_loop(), {}).get(key)
+        if pool is None:
+            return await cls.beta_create(template=key[1])
+
+        timeout = pool.opts["timeout"] or cls.default_sandbox_timeout
+        while True:
+            sandbox, expired = pool.take(timeout)
+            for expired_sandbox in expired:
+                cls._schedule_warm_pool_refill(key, pool, expired_sandbox)
+            if sandbox is None:
+                return await cls.beta_create(**pool.opts)
+
+            cls._schedule_warm_pool_refill(key, pool)
+            try:
+                # Its timeout has been running since it was created
+                await sandbox.set_timeout(timeout)
+            except Exception:
+                logger.warning(
+                    "Pooled sandbox %s is gone, taking the next one", sandbox.sandbox_id
+                )
+                continue
+            return sandbox
+
+    @classmethod
+    def _schedule_warm_pool_refill(
+        cls,
+        key: Tuple[type, str],
+        pool: _WarmPool,
+        expired: Optional["AsyncSandbox"] = None,
+    ) -> None:
+        task = asyncio.ensure_future(cls._refill_warm_pool(key, pool, expired))
+        _warm_pool_tasks.add(task)
+        task.add_done_callback(_warm_pool_tasks.discard)
+
+    @classmethod
+    async def _refill_warm_pool(
+        cls,
+        key: Tuple[type, str],
+        pool: _WarmPool,
+        expired: Optional["AsyncSandbox"] = None,
+    ) -> None:
+        if expired is not None:
+            try:
+                await expired.kill()
+            except Exception:
+                pass
+
+        requested_at = time.monotonic()
+        pool.pending += 1
+        try:
+            sandbox = await cls.beta_create(**pool.opts)
+        except Exception:
+            logger.exception("Failed to refill the sandbox pool for %s", key[1])
+            return
+        finally:
+            pool.pending -= 1
+
+        if _warm_pools.get(asyncio.get_running_loop(), {}).get(key) is not pool:
+            # The pool was drained while the sandbox was being created
+            try:
+                await sandbox.kill()
+            except Exception:
+                logger.warning(
+                    "Failed to kill sandbox %s of a drained pool", sandbox.sandbox_id
+                )
+            return
+
+        pool.add(requested_at, [sandbox])
+
+    @classmethod
+    async def drain_warm_pool(cls, template: Optional[str] = None) -> None:
+        """
+        [BETA] This feature is in beta and may change in the future.
+
+        Kill the idle sandboxes kept for the template by `ensure_warm()` and stop refilling its pool.
+
+        :param template: Sandbox template name or ID
+        """
+        pools = _warm_pools.get(asyncio.get_running_loop(), {})
+        pool = pools.pop((cls, template or cls.default_template), None)
+        if pool is None:
+            return
+
+        sandboxes = [sandbox for _, sandbox in pool.sandboxes]
+        pool.sandboxes.clear()
+        await asyncio.gather(
+            *(sandbox.kill() for sandbox in sandboxes),
+            return_exceptions=True,
+        )
+
     async def set_model_information(
         self,
         model: str,
@@ -1,10 +1,23 @@
+import asyncio
+import httpx
 import urllib.parse
-
-from typing import Optional, Dict, List
-from packaging.version import Version
-
-
-from agentbox.sandbox.sandbox_api import SandboxInfo, SandboxApiBase, SandboxQuery, ListedSandbox
+import weakref
+
+from typing import Awaitable, Callable, Optional, Dict, List, Tuple, TypeVar
+
+from agentbox.sandbox.sandbox_api import (
+    SandboxInfo,
+    SandboxApiBase,
+    SandboxQuery,
+    ListedSandbox,
+    _RETRY_ATTEMPTS,
+    _RETRY_CREATE_STATUS_CODES,
+    _RETRY_STATUS_CODES,
+    _BrdDetailsCache,
+    _retry_delay,
+    _str_or_none,
+)
+from agentbox.envd.versions import _ENVD_VERSION_MINIMUM_KEY, parse_envd_version
 from agentbox.exceptions import TemplateException, SandboxException
 from agentbox.api import AsyncApiClient, SandboxCreateResponse
 from agentbox.api.client.models import NewSandbox, PostSandboxesSandboxIDTimeoutBody, SandboxADB, SandboxADBPublicInfo, SandboxSSH, InstanceAuthInfo, ResumedSandbox, Sandbox, Error, ConnectSandbox
@@ -28,9 +41,79 @@ from agentbox.api.client.api.sandboxes import (
 )
 from agentbox.connection_config import ConnectionConfig, ProxyTypes
 from agentbox.api import handle_api_exception
+from agentbox.api.client.types import Response
+from httpx import AsyncHTTPTransport
+
+T = TypeVar("T")
 
+# One httpx client per API host and proxy is shared by all calls, the API key
+# and headers (e.g. the access token of a sandbox) are sent per request, so
+# they do not add clients. httpx clients are bound to the event loop they
+# were used in, so they are kept per loop and dropped together with it.
+_api_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def _with_retry(
+    request: Callable[[], Awaitable[Response[T]]],
+    idempotent: bool,
+) -> Response[T]:
+    retry_status_codes = (
+        _RETRY_STATUS_CODES if idempotent else _RETRY_CREATE_STATUS_CODES
+    )
+    for attempt in range(_RETRY_ATTEMPTS - 1):
+        res = None
+        try:
+            res = await request()
+        except httpx.TransportError:
+            # The request may have reached the server
+            if not idempotent:
+                raise
+        else:
+            if res.status_code not in retry_status_codes:
+                return res
+        delay = _retry_delay(attempt, res)
+        if delay is None:
+            return res
+        await asyncio.sleep(delay)
+
+    return await request()
+
+
+_brd_details = _BrdDetailsCache()
 
 class SandboxApi(SandboxApiBase):
+    __slots__ = ()
+
+    @classmethod
+    def _get_api_client(cls, config: ConnectionConfig) -> AsyncApiClient:
+        loop = asyncio.get_running_loop()
+        http_clients = _api_http_clients.setdefault(loop, {})
+        key = cls._get_api_client_key(config)
+        http_client = http_clients.get(key)
+        if http_client is None:
+            http_client = http_clients[key] = AsyncApiClient.create_http_client(
+                config,
+                transport=AsyncHTTPTransport(
+                    limits=cls._limits, proxy=config.proxy, http2=True
+                ),
+            )
+        return AsyncApiClient(config, http_client=http_client)
+
+    @classmethod
+    async def close_api_clients(cls) -> None:
+        """
+        Close the connections held by the API clients shared in the current event loop.
+
+        New clients are created on the next API call, call this before closing the event loop to release the connections cleanly.
+        """
+        loop = asyncio.get_running_loop()
+        http_clients = _api_http_clients.pop(loop, {})
+
+        for http_client in http_clients.values():
+            await http_client.aclose()
+
     @classmethod
     async def list(
         cls,
@@ -74,14 +157,11 @@ class SandboxApi(SandboxApiBase):
                 }
                 metadata = urllib.parse.urlencode(quoted_metadata)
 
-        async with AsyncApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = await get_sandboxes.asyncio_detailed(
-                client=api_client,
-                metadata=metadata,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await get_sandboxes.asyncio_detailed(
+            client=api_client,
+            metadata=metadata,
+        )
 
         if res.status_code >= 300:
             raise handle_api_exception(res)
@@ -89,25 +169,7 @@ class SandboxApi(SandboxApiBase):
         if res.parsed is None:
             return []
 
-        return [
-            ListedSandbox(
-                sandbox_id=SandboxApi._get_sandbox_id(
-                    sandbox.sandbox_id,
-                    sandbox.client_id,
-                ),
-                template_id=sandbox.template_id,
-                name=sandbox.alias if isinstance(sandbox.alias, str) else None,
-                metadata=(
-                    sandbox.metadata if isinstance(sandbox.metadata, dict) else {}
-                ),
-                state=sandbox.state,
-                cpu_count=sandbox.cpu_count,
-                memory_mb=sandbox.memory_mb,
-                started_at=sandbox.started_at,
-                end_at=sandbox.end_at,
-            )
-            for sandbox in res.parsed
-        ]
+        return list(map(SandboxApi._listed_sandbox_from_model, res.parsed))
 
     @classmethod
     async def get_info(
@@ -141,37 +203,20 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        async with AsyncApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = await get_sandboxes_sandbox_id.asyncio_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await get_sandboxes_sandbox_id.asyncio_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
+
+        return SandboxApi._sandbox_info_from_detail(res.parsed)
 
-            return SandboxInfo(
-                sandbox_id=SandboxApi._get_sandbox_id(
-                    res.parsed.sandbox_id,
-                    res.parsed.client_id,
-                ),
-                template_id=res.parsed.template_id,
-                name=res.parsed.alias if isinstance(res.parsed.alias, str) else None,
-                metadata=(
-                    res.parsed.metadata if isinstance(res.parsed.metadata, dict) else {}
-                ),
-                started_at=res.parsed.started_at,
-                end_at=res.parsed.end_at,
-                envd_version=res.parsed.envd_version,
-                _envd_access_token=res.parsed.envd_access_token,
-            )
-        
     @classmethod
     async def get_instance_no(
         cls,
@@ -204,23 +249,20 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        async with AsyncApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = await get_sandboxes_sandbox_id_instance_no.asyncio_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await get_sandboxes_sandbox_id_instance_no.asyncio_detailed(
+            sandbox_id,
+            client=api_client,
+        )
+
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        return res.parsed
 
-            return res.parsed
-        
     @classmethod
     async def get_instance_auth_info(
         cls,
@@ -253,23 +295,20 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        async with AsyncApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = await get_sandboxes_sandbox_id_instance_auth_info.asyncio_detailed(
-                sandbox_id,
-                client=api_client,
-                valid_time=valid_time,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await get_sandboxes_sandbox_id_instance_auth_info.asyncio_detailed(
+            sandbox_id,
+            client=api_client,
+            valid_time=valid_time,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
 
-            return res.parsed
+        return res.parsed
 
 
     @classmethod
@@ -304,23 +343,20 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        async with AsyncApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = await get_sandboxes_sandbox_id_adb.asyncio_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await get_sandboxes_sandbox_id_adb.asyncio_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
+
+        return res.parsed
 
-            return res.parsed
-        
     @classmethod
     async def _get_adb_public_info(
         cls,
@@ -353,22 +389,19 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        async with AsyncApiClient(
-            config,
-            limits=cls._limits,
-        ) as api_client:
-            res = await get_sandboxes_sandbox_id_adb_public_info.asyncio_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await get_sandboxes_sandbox_id_adb_public_info.asyncio_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
 
-            return res.parsed
+        return res.parsed
 
     @classmethod
     async def _get_ssh(
@@ -402,22 +435,55 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        async with AsyncApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = await get_sandboxes_sandbox_id_ssh.asyncio_detailed(
+        api_client = SandboxApi._get_api_client(config)
+        res = await _with_retry(
+            lambda: get_sandboxes_sandbox_id_ssh.asyncio_detailed(
                 sandbox_id,
                 client=api_client,
-            )
+            ),
+            idempotent=True,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
 
-            return res.parsed
+        return res.parsed
+
+    @classmethod
+    async def _get_brd_details(
+        cls,
+        sandbox_id: str,
+        api_key: Optional[str] = None,
+        domain: Optional[str] = None,
+        debug: Optional[bool] = None,
+        request_timeout: Optional[float] = None,
+        proxy: Optional[ProxyTypes] = None,
+    ) -> Tuple[SandboxSSH, SandboxADB]:
+        """
+        Get the SSH and ADB information of a brd sandbox, reused for a few seconds by repeated connects.
+        """
+        key = (sandbox_id, api_key, domain, debug, proxy)
+        details = _brd_details.get(key)
+        if details is not None:
+            return details
+
+        api_params = dict(
+            sandbox_id=sandbox_id,
+            api_key=api_key,
+            domain=domain,
+            debug=debug,
+            request_timeout=request_timeout,
+            proxy=proxy,
+        )
+        details = await asyncio.gather(
+            cls._get_ssh(**api_params), cls._get_adb(**api_params)
+        )
+        details = (details[0], details[1])
+        _brd_details.set(key, details)
+        return details
 
     @classmethod
     async def _cls_kill(
@@ -430,6 +496,8 @@ class SandboxApi(SandboxApiBase):
         headers: Optional[Dict[str, str]] = None,
         proxy: Optional[ProxyTypes] = None,
     ) -> bool:
+        _brd_details.forget(sandbox_id)
+
         config = ConnectionConfig(
             api_key=api_key,
             domain=domain,
@@ -443,22 +511,19 @@ class SandboxApi(SandboxApiBase):
             # Skip killing the sandbox in debug mode
             return True
 
-        async with AsyncApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = await delete_sandboxes_sandbox_id.asyncio_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await delete_sandboxes_sandbox_id.asyncio_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code == 404:
-                return False
+        if res.status_code == 404:
+            return False
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            return True
+        return True
 
     @classmethod
     async def _cls_set_timeout(
@@ -485,18 +550,15 @@ class SandboxApi(SandboxApiBase):
             # Skip setting the timeout in debug mode
             return
 
-        async with AsyncApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = await post_sandboxes_sandbox_id_timeout.asyncio_detailed(
-                sandbox_id,
-                client=api_client,
-                body=PostSandboxesSandboxIDTimeoutBody(timeout=timeout),
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await post_sandboxes_sandbox_id_timeout.asyncio_detailed(
+            sandbox_id,
+            client=api_client,
+            body=PostSandboxesSandboxIDTimeoutBody(timeout=timeout),
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
     @classmethod
     async def _create_sandbox(
@@ -523,11 +585,9 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        async with AsyncApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = await post_sandboxes.asyncio_detailed(
+        api_client = SandboxApi._get_api_client(config)
+        res = await _with_retry(
+            lambda: post_sandboxes.asyncio_detailed(
                 body=NewSandbox(
                     template_id=template,
                     metadata=metadata or {},
@@ -537,35 +597,37 @@ class SandboxApi(SandboxApiBase):
                     auto_pause=auto_pause,
                 ),
                 client=api_client,
-            )
-
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+            ),
+            idempotent=False,
+        )
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if Version(res.parsed.envd_version) < Version("0.1.0"):
-                await SandboxApi._cls_kill(
-                    SandboxApi._get_sandbox_id(
-                        res.parsed.sandbox_id,
-                        res.parsed.client_id,
-                    )
-                )
-                raise TemplateException(
-                    "You need to update the template to use the new SDK. "
-                    "You can do this by running `agentbox template build` in the directory with the template."
-                )
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
 
-            return SandboxCreateResponse(
-                sandbox_id=SandboxApi._get_sandbox_id(
+        if parse_envd_version(res.parsed.envd_version) < _ENVD_VERSION_MINIMUM_KEY:
+            await SandboxApi._cls_kill(
+                SandboxApi._get_sandbox_id(
                     res.parsed.sandbox_id,
                     res.parsed.client_id,
-                ),
-                envd_version=res.parsed.envd_version,
-                envd_access_token=res.parsed.envd_access_token,
+                )
+            )
+            raise TemplateException(
+                "You need to update the template to use the new SDK. "
+                "You can do this by running `agentbox template build` in the directory with the template."
             )
 
+        return SandboxCreateResponse(
+            sandbox_id=SandboxApi._get_sandbox_id(
+                res.parsed.sandbox_id,
+                res.parsed.client_id,
+            ),
+            envd_version=res.parsed.envd_version,
+            envd_access_token=_str_or_none(res.parsed.envd_access_token),
+        )
+
     @classmethod
     async def _cls_resume(
         cls,
@@ -576,6 +638,8 @@ class SandboxApi(SandboxApiBase):
         debug: Optional[bool] = None,
         request_timeout: Optional[float] = None,
     ) -> bool:
+        _brd_details.forget(sandbox_id)
+
         config = ConnectionConfig(
             api_key=api_key,
             domain=domain,
@@ -583,23 +647,23 @@ class SandboxApi(SandboxApiBase):
             request_timeout=request_timeout,
         )
 
-        async with AsyncApiClient(config,limits=SandboxApiBase._limits) as api_client:
-            res = await post_sandboxes_sandbox_id_resume.asyncio_detailed(
-                sandbox_id,
-                client=api_client,
-                body=ResumedSandbox(timeout=timeout),
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await post_sandboxes_sandbox_id_resume.asyncio_detailed(
+            sandbox_id,
+            client=api_client,
+            body=ResumedSandbox(timeout=timeout),
+        )
 
-            if res.status_code == 404:
-                raise Exception(f"Paused sandbox {sandbox_id} not found")
+        if res.status_code == 404:
+            raise Exception(f"Paused sandbox {sandbox_id} not found")
 
-            if res.status_code == 409:
-                return False
+        if res.status_code == 409:
+            return False
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            return True
+        return True
 
     @classmethod
     async def _cls_pause(
@@ -610,6 +674,8 @@ class SandboxApi(SandboxApiBase):
         debug: Optional[bool] = None,
         request_timeout: Optional[float] = None,
     ) -> bool:
+        _brd_details.forget(sandbox_id)
+
         config = ConnectionConfig(
             api_key=api_key,
             domain=domain,
@@ -617,22 +683,22 @@ class SandboxApi(SandboxApiBase):
             request_timeout=request_timeout,
         )
 
-        async with AsyncApiClient(config,limits=SandboxApiBase._limits) as api_client:
-            res = await post_sandboxes_sandbox_id_pause.asyncio_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await post_sandboxes_sandbox_id_pause.asyncio_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code == 404:
-                raise Exception(f"Sandbox {sandbox_id} not found")
+        if res.status_code == 404:
+            raise Exception(f"Sandbox {sandbox_id} not found")
 
-            if res.status_code == 409:
-                return False
+        if res.status_code == 409:
+            return False
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            return True
+        return True
 
     @classmethod
     async def _cls_connect(
@@ -655,28 +721,25 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        async with AsyncApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = await post_sandboxes_sandbox_id_connect.asyncio_detailed(
-                sandbox_id,
-                client=api_client,
-                body=ConnectSandbox(
-                    timeout=timeout,
-                ),
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await post_sandboxes_sandbox_id_connect.asyncio_detailed(
+            sandbox_id,
+            client=api_client,
+            body=ConnectSandbox(
+                timeout=timeout,
+            ),
+        )
 
-            if res.status_code == 404:
-                raise Exception(f"Sandbox {sandbox_id} not found")
+        if res.status_code == 404:
+            raise Exception(f"Sandbox {sandbox_id} not found")
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if isinstance(res.parsed, Error):
-                raise SandboxException(f"{res.parsed.message}: Request failed")
+        if isinstance(res.parsed, Error):
+            raise SandboxException(f"{res.parsed.message}: Request failed")
 
-            return res.parsed
+        return res.parsed
 
     @classmethod
     async def _cls_set_model_information(
@@ -701,18 +764,18 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        async with AsyncApiClient(config,limits=SandboxApiBase._limits) as api_client:
-            res = await post_sandboxes_sandbox_id_model_information.asyncio_detailed(
-                sandbox_id=sandbox_id,
-                client=api_client,
-                body=ModelInformationRequest(
-                    model=model,
-                    brand=brand,
-                    manufacturer=manufacturer,
-                ),
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = await post_sandboxes_sandbox_id_model_information.asyncio_detailed(
+            sandbox_id=sandbox_id,
+            client=api_client,
+            body=ModelInformationRequest(
+                model=model,
+                brand=brand,
+                manufacturer=manufacturer,
+            ),
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            return res.parsed
\ No newline at end of file
+        return res.parsed
\ No newline at end of file
@@ -1,6 +1,7 @@
 from typing import Callable, Dict, List, Literal, Optional, Union, overload
 
 import shlex
+import threading
 import paramiko
 import time
 from agentbox.connection_config import ConnectionConfig, Username
@@ -9,44 +10,94 @@ from agentbox.sandbox.commands.command_handle import CommandResult
 from agentbox.sandbox_sync.commands_ssh2.command_handle_ssh2 import SSHSyncCommandHandle2, Stderr, Stdout
 
 
-class SSHCommands2:
+class SSHConnection:
     """
-    Module for executing commands in the sandbox.
+    Lazily connected SSH client that can be shared by several `SSHCommands2` instances,
+    each command runs on its own channel over the same transport.
     """
 
+    # Seconds between keepalive packets, so the connection survives idle periods
+    keepalive_interval = 30
+
     def __init__(
         self,
         ssh_host: str,
         ssh_port: int,
         ssh_username: str,
         ssh_password: str,
-        connection_config: ConnectionConfig,
     ) -> None:
         self._ssh_host = ssh_host
         self._ssh_port = ssh_port
         self._ssh_username = ssh_username
         self._ssh_password = ssh_password
-        self._connection_config = connection_config
         self._client: Optional[paramiko.SSHClient] = None
-        self._processes: Dict[int, SSHSyncCommandHandle2] = {}
+        self._lock = threading.Lock()
 
-    def _get_ssh_client(self) -> paramiko.SSHClient:
-        if (
-            self._client is None
-            or not self._client.get_transport()
-            or not self._client.get_transport().is_active()
-        ):
-            self._client = paramiko.SSHClient()
-            self._client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            self._client.connect(
+    def _is_active(self) -> bool:
+        if self._client is None:
+            return False
+        transport = self._client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def get_client(self) -> paramiko.SSHClient:
+        if self._is_active():
+            return self._client
+
+        with self._lock:
+            # Another thread may have connected while we were waiting
+            if self._is_active():
+                return self._client
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.connect(
                 hostname=self._ssh_host,
                 port=self._ssh_port,
                 username=self._ssh_username,
                 password=self._ssh_password,
                 timeout=30,
             )
+            client.get_transport().set_keepalive(self.keepalive_interval)
+            self._client = client
+
         return self._client
 
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class SSHCommands2:
+    """
+    Module for executing commands in the sandbox.
+    """
+
+    def __init__(
+        self,
+        ssh_host: str,
+        ssh_port: int,
+        ssh_username: str,
+        ssh_password: str,
+        connection_config: ConnectionConfig,
+        ssh_connection: Optional[SSHConnection] = None,
+    ) -> None:
+        self._ssh_host = ssh_host
+        self._ssh_port = ssh_port
+        self._ssh_username = ssh_username
+        self._ssh_password = ssh_password
+        self._connection_config = connection_config
+        self._ssh_connection = ssh_connection or SSHConnection(
+            ssh_host,
+            ssh_port,
+            ssh_username,
+            ssh_password,
+        )
+        self._processes: Dict[int, SSHSyncCommandHandle2] = {}
+
+    def _get_ssh_client(self) -> paramiko.SSHClient:
+        return self._ssh_connection.get_client()
+
     def list(self, request_timeout: Optional[float] = None) -> List[ProcessInfo]:
         # ps -eo pid,comm,args --no-headers
         processes = []
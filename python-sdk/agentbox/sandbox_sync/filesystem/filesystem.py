@@ -5,9 +5,8 @@ from agentbox.sandbox.filesystem.filesystem import WriteEntry
 import agentbox_connect
 import httpcore
 import httpx
-from packaging.version import Version
 
-from agentbox.envd.versions import ENVD_VERSION_RECURSIVE_WATCH
+from agentbox.envd.versions import _ENVD_VERSION_RECURSIVE_WATCH_KEY, parse_envd_version
 from agentbox.exceptions import TemplateException, InvalidArgumentException
 from agentbox.connection_config import (
     ConnectionConfig,
@@ -433,7 +432,7 @@ class Filesystem:
         if (
             recursive
             and self._envd_version is not None
-            and Version(self._envd_version) < ENVD_VERSION_RECURSIVE_WATCH
+            and parse_envd_version(self._envd_version) < _ENVD_VERSION_RECURSIVE_WATCH_KEY
         ):
             raise TemplateException(
                 "You need to update the template to use recursive watching. "
@@ -19,6 +19,9 @@ class SSHSyncWatchHandle:
         self._path = path
         self._recursive = recursive
         self._running = True
+        # Polling keeps failing the same way, e.g. while the sandbox is paused,
+        # so an error is only printed once until the next successful poll
+        self._state_error_reported = False
         self._last_state = self._get_file_state()
 
     def stop(self):
@@ -62,9 +65,12 @@ class SSHSyncWatchHandle:
                 except ValueError:
                     continue
 
+            self._state_error_reported = False
             return current_state
         except Exception as e:
-            print(f"[get_file_state] Error: {e}")
+            if not self._state_error_reported:
+                self._state_error_reported = True
+                print(f"[get_file_state] Error: {e}")
             return {}
 
     def _detect_changes(self, old_state, new_state):
@@ -1,18 +1,25 @@
+import atexit
 import logging
+import socket
+import threading
+import time
 import httpx
-import re
+import weakref
 from datetime import datetime
 
-from typing import Dict, Optional, overload
+from typing import Dict, Optional, Tuple, overload
 from typing_extensions import Self
 
 from agentbox.api.client.models import SandboxADB, InstanceAuthInfo
-from agentbox.api.client.types import Unset
 from agentbox.connection_config import ConnectionConfig, ProxyTypes
 from agentbox.envd.api import ENVD_API_HEALTH_ROUTE, handle_envd_api_exception
 from agentbox.exceptions import SandboxException, format_request_timeout_error
 from agentbox.sandbox.main import SandboxSetup
-from agentbox.sandbox.utils import class_method_variant
+from agentbox.sandbox.utils import (
+    class_method_variant,
+    is_brd_sandbox_id,
+    parse_ssh_connect_command,
+)
 from agentbox.sandbox_sync.adb_shell.adb_shell import ADBShell
 from agentbox.sandbox_sync.filesystem.filesystem import Filesystem
 from agentbox.sandbox_sync.commands.command import Commands
@@ -20,23 +27,93 @@ from agentbox.sandbox_sync.commands.pty import Pty
 from agentbox.sandbox_sync.sandbox_api import SandboxApi, SandboxInfo
 from agentbox.sandbox_sync.commands_ssh.command_ssh import SSHCommands
 from agentbox.sandbox_sync.filesystem_ssh.filesystem_ssh import SSHSyncFilesystem
-from agentbox.sandbox_sync.commands_ssh2.command_ssh2 import SSHCommands2
+from agentbox.sandbox_sync.commands_ssh2.command_ssh2 import (
+    SSHCommands2,
+    SSHConnection,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class TransportWithLogger(httpx.HTTPTransport):
     def handle_request(self, request):
-        url = f"{request.url.scheme}://{request.url.host}{request.url.path}"
-        logger.info(f"Request: {request.method} {url}")
+        # Only format the log lines when they are going to be emitted
+        if not logger.isEnabledFor(logging.INFO):
+            return super().handle_request(request)
+
+        url = request.url
+        logger.info("Request: %s %s://%s%s", request.method, url.scheme, url.host, url.path)
         response = super().handle_request(request)
 
         # data = connect.GzipCompressor.decompress(response.read()).decode()
-        logger.info(f"Response: {response.status_code} {url}")
+        logger.info("Response: %s %s://%s%s", response.status_code, url.scheme, url.host, url.path)
 
         return response
 
 
+# Envd clients are shared by sandbox objects pointing at the same sandbox with
+# the same settings, and the transports, which own the connection pools, by all
+# sandboxes with the same proxy and limits, so pooled connections are reused
+# across sandboxes. Both are only kept for as long as a sandbox object still
+# references them.
+_envd_clients: "weakref.WeakValueDictionary[tuple, httpx.Client]" = (
+    weakref.WeakValueDictionary()
+)
+_envd_transports: "weakref.WeakValueDictionary[tuple, TransportWithLogger]" = (
+    weakref.WeakValueDictionary()
+)
+_envd_clients_lock = threading.Lock()
+
+
+def _get_shared_envd_api(
+    envd_api_url: str,
+    connection_config: ConnectionConfig,
+    limits: httpx.Limits,
+) -> httpx.Client:
+    proxy = connection_config.proxy
+    key = (
+        envd_api_url,
+        proxy,
+        tuple(sorted(connection_config.headers.items())),
+    )
+
+    with _envd_clients_lock:
+        envd_api = _envd_clients.get(key)
+        if envd_api is not None:
+            return envd_api
+
+        # httpx.Limits is not hashable
+        transport_key = (
+            proxy,
+            limits.max_connections,
+            limits.max_keepalive_connections,
+            limits.keepalive_expiry,
+        )
+        transport = _envd_transports.get(transport_key)
+        if transport is None:
+            # envd negotiates HTTP/2 over ALPN when it supports it, so the
+            # filesystem, commands and pty calls can share one connection.
+            transport = _envd_transports[transport_key] = TransportWithLogger(
+                limits=limits, proxy=proxy, http2=True
+            )
+
+        envd_api = _envd_clients[key] = httpx.Client(
+            base_url=envd_api_url,
+            transport=transport,
+            headers=connection_config.headers,
+        )
+        return envd_api
+
+
+@atexit.register
+def _close_envd_transports() -> None:
+    with _envd_clients_lock:
+        transports = list(_envd_transports.values())
+
+    for transport in transports:
+        transport.close()
+
+
 class Sandbox(SandboxSetup, SandboxApi):
     """
     E2B cloud sandbox is a secure and isolated cloud environment.
@@ -60,11 +137,45 @@ class Sandbox(SandboxSetup, SandboxApi):
     ```
     """
 
+    # Sandboxes are often kept around in large numbers, slots keep them small.
+    # Only the attributes used by the sandbox kind (brd or envd) are set.
+    __slots__ = (
+        "_sandbox_id",
+        "_connection_config",
+        "_ssh_host",
+        "_ssh_port",
+        "_ssh_username",
+        "_ssh_password",
+        "_ssh_connection",
+        "_envd_api_url",
+        "_envd_version",
+        "_envd_access_token",
+        "_instance_no",
+        "_auth_info_cache",
+        "_is_brd",
+        "_envd_api",
+        "_commands",
+        "_watch_commands",
+        "_filesystem",
+        "_adb_shell",
+        "_pty",
+        "__weakref__",
+    )
+
     @property
     def files(self) -> Filesystem:
         """
         Module for interacting with the sandbox filesystem.
         """
+        if self._filesystem is None:
+            envd_api = self._get_envd_api()
+            self._filesystem = Filesystem(
+                self.envd_api_url,
+                self._envd_version,
+                self.connection_config,
+                envd_api._transport._pool,
+                envd_api,
+            )
         return self._filesystem
 
     @property
@@ -72,6 +183,12 @@ class Sandbox(SandboxSetup, SandboxApi):
         """
         Module for running commands in the sandbox.
         """
+        if self._commands is None:
+            self._commands = Commands(
+                self.envd_api_url,
+                self.connection_config,
+                self._get_envd_api()._transport._pool,
+            )
         return self._commands
 
     @property
@@ -86,6 +203,12 @@ class Sandbox(SandboxSetup, SandboxApi):
         """
         Module for interacting with the sandbox pseudo-terminal.
         """
+        if self._pty is None:
+            self._pty = Pty(
+                self.envd_api_url,
+                self.connection_config,
+                self._get_envd_api()._transport._pool,
+            )
         return self._pty
 
     @property
@@ -97,18 +220,13 @@ class Sandbox(SandboxSetup, SandboxApi):
 
     @property
     def envd_api_url(self) -> str:
+        # brd sandboxes are reached over SSH and never need it, so it is only
+        # built when asked for.
+        if self._envd_api_url is None:
+            scheme = "http" if self._connection_config.debug else "https"
+            self._envd_api_url = f"{scheme}://{self.get_host(self.envd_port)}"
         return self._envd_api_url
 
-    @property
-    def _envd_access_token(self) -> str:
-        """Private property to access the envd token"""
-        return self.__envd_access_token
-
-    @_envd_access_token.setter
-    def _envd_access_token(self, value: Optional[str]):
-        """Private setter for envd token"""
-        self.__envd_access_token = value
-
     @property
     def connection_config(self) -> ConnectionConfig:
         return self._connection_config
@@ -144,13 +262,17 @@ class Sandbox(SandboxSetup, SandboxApi):
         """
         super().__init__()
 
+        self._instance_no: Optional[str] = None
+        self._envd_api_url: Optional[str] = None
+        self._auth_info_cache: Dict[int, Tuple[float, InstanceAuthInfo]] = {}
+
         if sandbox_id and (metadata is not None or template is not None):
             raise SandboxException(
                 "Cannot set metadata or timeout when connecting to an existing sandbox. "
                 "Use Sandbox.connect method instead.",
             )
 
-        connection_headers = {}
+        connection_headers = None
 
         if debug:
             self._sandbox_id = "debug_sandbox_id"
@@ -175,10 +297,8 @@ class Sandbox(SandboxSetup, SandboxApi):
             self._envd_version = response.envd_version
             self._envd_access_token = response._envd_access_token
 
-            if response._envd_access_token is not None and not isinstance(
-                    response._envd_access_token, Unset
-            ):
-                connection_headers["X-Access-Token"] = response._envd_access_token
+            if response._envd_access_token is not None:
+                connection_headers = {"X-Access-Token": response._envd_access_token}
 
         else:
             template = template or self.default_template
@@ -198,15 +318,13 @@ class Sandbox(SandboxSetup, SandboxApi):
             self._sandbox_id = response.sandbox_id
             self._envd_version = response.envd_version
 
-            if response.envd_access_token is not None and not isinstance(
-                response.envd_access_token, Unset
-            ):
+            # SandboxApi has already turned a missing token into None
+            if response.envd_access_token is not None:
                 self._envd_access_token = response.envd_access_token
-                connection_headers["X-Access-Token"] = response.envd_access_token
+                connection_headers = {"X-Access-Token": response.envd_access_token}
             else:
                 self._envd_access_token = None
 
-        self._transport = TransportWithLogger(limits=self._limits, proxy=proxy)
         self._connection_config = ConnectionConfig(
             api_key=api_key,
             domain=domain,
@@ -216,10 +334,12 @@ class Sandbox(SandboxSetup, SandboxApi):
             proxy=proxy,
         )
 
+        self._is_brd = is_brd_sandbox_id(self._sandbox_id)
+
         # 根据 sandbox id 进行区分 commands 类型
-        if "brd" in self._sandbox_id.lower():
+        if self._is_brd:
             # ssh info
-            ssh_info = SandboxApi._get_ssh(
+            ssh_info = SandboxApi._get_brd_ssh(
                 sandbox_id=self._sandbox_id,
                 api_key=api_key,
                 domain=domain,
@@ -229,15 +349,10 @@ class Sandbox(SandboxSetup, SandboxApi):
             )
             # print("ssh_info:", ssh_info)
             # Parse SSH connection details from the connect command
-            pattern = r'ssh\s+-p\s+(\d+).*?\s+([^@\s]+)@([\w\.-]+)'
-            ssh_match = re.search(pattern, ssh_info.connect_command)
-            if ssh_match:
-                self._ssh_port = int(ssh_match.group(1))
-                self._ssh_username = ssh_match.group(2)
-                self._ssh_host = ssh_match.group(3)
-                self._ssh_password = ssh_info.auth_password
-            else:
-                raise Exception("Could not parse SSH connection details")
+            self._ssh_port, self._ssh_username, self._ssh_host = (
+                parse_ssh_connect_command(ssh_info.connect_command)
+            )
+            self._ssh_password = ssh_info.auth_password
             # Get adb connection details
             # self._adb_info = SandboxApi._get_adb(
             #     sandbox_id=self._sandbox_id,
@@ -260,12 +375,20 @@ class Sandbox(SandboxSetup, SandboxApi):
             #     self._ssh_password,
             #     self.connection_config,
             # )
+            # Both command modules multiplex their channels over one SSH connection
+            self._ssh_connection = SSHConnection(
+                self._ssh_host,
+                self._ssh_port,
+                self._ssh_username,
+                self._ssh_password,
+            )
             self._watch_commands = SSHCommands2(
                 self._ssh_host,
                 self._ssh_port,
                 self._ssh_username,
                 self._ssh_password,
                 self.connection_config,
+                self._ssh_connection,
             )
             self._commands = SSHCommands2(
                 self._ssh_host,
@@ -273,6 +396,7 @@ class Sandbox(SandboxSetup, SandboxApi):
                 self._ssh_username,
                 self._ssh_password,
                 self.connection_config,
+                self._ssh_connection,
             )
             self._filesystem = SSHSyncFilesystem(
                 self._ssh_host,
@@ -287,31 +411,20 @@ class Sandbox(SandboxSetup, SandboxApi):
                 connection_config=self.connection_config,
                 sandbox_id=self._sandbox_id
             )
-        else:  
-            self._envd_api_url = f"{'http' if self.connection_config.debug else 'https'}://{self.get_host(self.envd_port)}"
-            self._envd_api = httpx.Client(
-                base_url=self.envd_api_url,
-                transport=self._transport,
-                headers=self.connection_config.headers,
-            )
-
-            self._filesystem = Filesystem(
-                self.envd_api_url,
-                self._envd_version,
-                self.connection_config,
-                self._transport._pool,
-                self._envd_api,
-            )
-            self._commands = Commands(
-                self.envd_api_url,
-                self.connection_config,
-                self._transport._pool,
-            )
-            self._pty = Pty(
-                self.envd_api_url,
-                self.connection_config,
-                self._transport._pool,
+        else:
+            # The envd client and the modules are built on first access, most
+            # callers only use some of them.
+            self._envd_api: Optional[httpx.Client] = None
+            self._filesystem = None
+            self._commands = None
+            self._pty = None
+
+    def _get_envd_api(self) -> httpx.Client:
+        if self._envd_api is None:
+            self._envd_api = _get_shared_envd_api(
+                self.envd_api_url, self._connection_config, self._limits
             )
+        return self._envd_api
 
     def is_running(self, request_timeout: Optional[float] = None) -> bool:
         """
@@ -330,10 +443,15 @@ class Sandbox(SandboxSetup, SandboxApi):
         sandbox.is_running() # Returns False
         ```
         """
+        timeout = self.connection_config.get_request_timeout(request_timeout)
+
+        if self._is_brd:
+            return self._is_ssh_reachable(timeout)
+
         try:
-            r = self._envd_api.get(
+            r = self._get_envd_api().get(
                 ENVD_API_HEALTH_ROUTE,
-                timeout=self.connection_config.get_request_timeout(request_timeout),
+                timeout=timeout,
             )
 
             if r.status_code == 502:
@@ -349,6 +467,15 @@ class Sandbox(SandboxSetup, SandboxApi):
 
         return True
 
+    def _is_ssh_reachable(self, timeout: Optional[float]) -> bool:
+        # brd sandboxes have no envd, a TCP connect to their SSH port is the
+        # cheapest check that the sandbox is still up.
+        try:
+            socket.create_connection((self._ssh_host, self._ssh_port), timeout).close()
+        except OSError:
+            return False
+        return True
+
     def __enter__(self):
         return self
 
@@ -396,16 +523,11 @@ class Sandbox(SandboxSetup, SandboxApi):
         :param request_timeout: Timeout for the request
         :return: `True` if the sandbox was killed, `False` if the sandbox was not found
         """
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
-
         return SandboxApi._cls_kill(
             sandbox_id=self.sandbox_id,
-            **config_dict,
+            **self.connection_config.get_api_params(
+                request_timeout=request_timeout
+            ),
         )
 
     @overload
@@ -458,17 +580,12 @@ class Sandbox(SandboxSetup, SandboxApi):
         timeout: int,
         request_timeout: Optional[float] = None,
     ) -> None:
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
-
         SandboxApi._cls_set_timeout(
             sandbox_id=self.sandbox_id,
             timeout=timeout,
-            **config_dict,
+            **self.connection_config.get_api_params(
+                request_timeout=request_timeout
+            ),
         )
 
     def get_info(  # type: ignore
@@ -480,16 +597,11 @@ class Sandbox(SandboxSetup, SandboxApi):
         :param request_timeout: Timeout for the request in **seconds**
         :return: Sandbox info
         """
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
-
         return SandboxApi.get_info(
             sandbox_id=self.sandbox_id,
-            **config_dict,
+            **self.connection_config.get_api_params(
+                request_timeout=request_timeout
+            ),
         )
     
     def get_instance_no(  # type: ignore
@@ -498,44 +610,60 @@ class Sandbox(SandboxSetup, SandboxApi):
     ) -> str:
         """
         Get sandbox instance number.
+
+        The instance number does not change for the lifetime of the sandbox, it is only requested once.
+
         :param request_timeout: Timeout for the request in **seconds**
         :return: Sandbox instance number
         """
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
+        if self._instance_no is None:
+            self._instance_no = SandboxApi.get_instance_no(
+                sandbox_id=self.sandbox_id,
+                **self.connection_config.get_api_params(
+                    request_timeout=request_timeout
+                ),
+            )
+        return self._instance_no
 
-        return SandboxApi.get_instance_no(
-            sandbox_id=self.sandbox_id,
-            **config_dict,
-        )
-    
     def get_instance_auth_info(  # type: ignore
         self,
         valid_time: Optional[int] = 3600,
         request_timeout: Optional[float] = None,
+        use_cache: bool = False,
     ) -> InstanceAuthInfo:
         """
         Get sandbox instance auth info.
+
+        :param valid_time: How long the auth info should be valid for in **seconds**
         :param request_timeout: Timeout for the request in **seconds**
+        :param use_cache: Reuse auth info requested earlier by this sandbox object with the same `valid_time` until shortly before it expires, use `clear_auth_cache()` to drop it
         :return: Sandbox instance auth info
         """
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-
-        if request_timeout:
-            config_dict["request_timeout"] = request_timeout
+        if use_cache and valid_time:
+            cached = self._auth_info_cache.get(valid_time)
+            if cached is not None and time.monotonic() < cached[0]:
+                return cached[1]
 
-        return SandboxApi.get_instance_auth_info(
+        requested_at = time.monotonic()
+        auth_info = SandboxApi.get_instance_auth_info(
             sandbox_id=self.sandbox_id,
             valid_time=valid_time,
-            **config_dict,
+            **self.connection_config.get_api_params(
+                request_timeout=request_timeout
+            ),
         )
 
+        if valid_time:
+            expires_at = requested_at + valid_time - self.auth_info_expiry_margin
+            self._auth_info_cache[valid_time] = (expires_at, auth_info)
+        return auth_info
+
+    def clear_auth_cache(self) -> None:
+        """
+        Drop the cached instance auth info, the next `get_instance_auth_info()` call requests a new one.
+        """
+        self._auth_info_cache.clear()
+
     @classmethod
     def resume(
         cls,
@@ -676,6 +804,16 @@ class Sandbox(SandboxSetup, SandboxApi):
 
         Use this method instead of using the constructor to create a new sandbox.
         """
+        if debug:
+            # The constructor sets up the debug sandbox without calling the API
+            return cls(
+                api_key=api_key,
+                domain=domain,
+                debug=debug,
+                request_timeout=request_timeout,
+                proxy=proxy,
+            )
+
         response = SandboxApi._create_sandbox(
             template=template or cls.default_template,
             timeout=timeout or cls.default_sandbox_timeout,
@@ -793,15 +931,15 @@ class Sandbox(SandboxSetup, SandboxApi):
         same_sandbox = sandbox.connect()
         ```
         """
-        config_dict = self.connection_config.__dict__
-        config_dict.pop("access_token", None)
-        config_dict.pop("api_url", None)
-        config_dict.pop("headers", None)
+        # connect() does not take the envd headers, those come from the
+        # connect response
+        api_params = dict(self.connection_config.get_api_params())
+        del api_params["headers"]
 
         return self.__class__._cls_connect(
             sandbox_id=self.sandbox_id,
             timeout=timeout,
-            **config_dict,
+            **api_params,
         )
 
 
@@ -816,20 +954,12 @@ class Sandbox(SandboxSetup, SandboxApi):
         request_timeout: Optional[float] = None,
         proxy: Optional[ProxyTypes] = None,
     ) -> Self:
-        if "brd" in sandbox_id.lower():
-            return cls(
-                sandbox_id=sandbox_id,
-                api_key=api_key,
-                domain=domain,
-                debug=debug,
-                request_timeout=request_timeout,
-                proxy=proxy,
-            )
-        else:
-            timeout = timeout or cls.default_connect_timeout
+        # brd sandboxes are reached over SSH, the constructor looks up their
+        # details, envd sandboxes have to be connected (resumed) first
+        if not is_brd_sandbox_id(sandbox_id):
             SandboxApi._cls_connect(
                 sandbox_id=sandbox_id,
-                timeout=timeout,
+                timeout=timeout or cls.default_connect_timeout,
                 api_key=api_key,
                 domain=domain,
                 debug=debug,
@@ -837,14 +967,14 @@ class Sandbox(SandboxSetup, SandboxApi):
                 proxy=proxy,
             )
 
-            return cls(
-                sandbox_id=sandbox_id,
-                api_key=api_key,
-                domain=domain,
-                debug=debug,
-                request_timeout=request_timeout,
-                proxy=proxy,
-            )
+        return cls(
+            sandbox_id=sandbox_id,
+            api_key=api_key,
+            domain=domain,
+            debug=debug,
+            request_timeout=request_timeout,
+            proxy=proxy,
+        )
 
 
     def set_model_information(
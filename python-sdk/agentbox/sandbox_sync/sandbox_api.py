@@ -1,9 +1,24 @@
+import atexit
+import httpx
+import threading
+import time
 import urllib.parse
 
-from typing import Optional, Dict, List
-from packaging.version import Version
-
-from agentbox.sandbox.sandbox_api import SandboxInfo, SandboxApiBase, SandboxQuery, ListedSandbox
+from typing import Callable, Optional, Dict, List, TypeVar
+
+from agentbox.sandbox.sandbox_api import (
+    SandboxInfo,
+    SandboxApiBase,
+    SandboxQuery,
+    ListedSandbox,
+    _RETRY_ATTEMPTS,
+    _RETRY_CREATE_STATUS_CODES,
+    _RETRY_STATUS_CODES,
+    _BrdDetailsCache,
+    _retry_delay,
+    _str_or_none,
+)
+from agentbox.envd.versions import _ENVD_VERSION_MINIMUM_KEY, parse_envd_version
 from agentbox.exceptions import TemplateException, SandboxException
 from agentbox.api import ApiClient, SandboxCreateResponse
 from agentbox.api.client.models import NewSandbox, PostSandboxesSandboxIDTimeoutBody, SandboxADB, SandboxADBPublicInfo, SandboxSSH, InstanceAuthInfo, ResumedSandbox, Sandbox, Error, ConnectSandbox
@@ -27,10 +42,80 @@ from agentbox.api.client.api.sandboxes import (
 )
 from agentbox.connection_config import ConnectionConfig, ProxyTypes
 from agentbox.api import handle_api_exception
+from agentbox.api.client.types import Response
 from httpx import HTTPTransport
 
+T = TypeVar("T")
+
+# One httpx client per API host and proxy is shared by all calls, so the
+# pooled connections to the API host are reused instead of being opened and
+# torn down for every request. The API key and headers (e.g. the access token
+# of a sandbox) are sent per request, so they do not add clients.
+_api_http_clients: Dict[tuple, httpx.Client] = {}
+_api_clients_lock = threading.Lock()
+
+
+def _with_retry(
+    request: Callable[[], Response[T]],
+    idempotent: bool,
+) -> Response[T]:
+    retry_status_codes = (
+        _RETRY_STATUS_CODES if idempotent else _RETRY_CREATE_STATUS_CODES
+    )
+    for attempt in range(_RETRY_ATTEMPTS - 1):
+        res = None
+        try:
+            res = request()
+        except httpx.TransportError:
+            # The request may have reached the server
+            if not idempotent:
+                raise
+        else:
+            if res.status_code not in retry_status_codes:
+                return res
+        delay = _retry_delay(attempt, res)
+        if delay is None:
+            return res
+        time.sleep(delay)
+
+    return request()
+
+
+_brd_details = _BrdDetailsCache()
 
 class SandboxApi(SandboxApiBase):
+    __slots__ = ()
+
+    @classmethod
+    def _get_api_client(cls, config: ConnectionConfig) -> ApiClient:
+        key = cls._get_api_client_key(config)
+        http_client = _api_http_clients.get(key)
+        if http_client is None:
+            with _api_clients_lock:
+                http_client = _api_http_clients.get(key)
+                if http_client is None:
+                    http_client = _api_http_clients[key] = ApiClient.create_http_client(
+                        config,
+                        transport=HTTPTransport(
+                            limits=cls._limits, proxy=config.proxy, http2=True
+                        ),
+                    )
+        return ApiClient(config, http_client=http_client)
+
+    @classmethod
+    def close_api_clients(cls) -> None:
+        """
+        Close the connections held by the shared API clients.
+
+        New clients are created on the next API call, this is only needed to release the connections early.
+        """
+        with _api_clients_lock:
+            http_clients = list(_api_http_clients.values())
+            _api_http_clients.clear()
+
+        for http_client in http_clients:
+            http_client.close()
+
     @classmethod
     def list(
         cls,
@@ -74,37 +159,16 @@ class SandboxApi(SandboxApiBase):
                 }
                 metadata = urllib.parse.urlencode(quoted_metadata)
 
-        with ApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = get_sandboxes.sync_detailed(client=api_client, metadata=metadata)
-
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
-
-            if res.parsed is None:
-                return []
-
-            return [
-                ListedSandbox(
-                    sandbox_id=SandboxApi._get_sandbox_id(
-                        sandbox.sandbox_id,
-                        sandbox.client_id,
-                    ),
-                    template_id=sandbox.template_id,
-                    name=sandbox.alias if isinstance(sandbox.alias, str) else None,
-                    metadata=(
-                        sandbox.metadata if isinstance(sandbox.metadata, dict) else {}
-                    ),
-                    state=sandbox.state,
-                    cpu_count=sandbox.cpu_count,
-                    memory_mb=sandbox.memory_mb,
-                    started_at=sandbox.started_at,
-                    end_at=sandbox.end_at,
-                )
-                for sandbox in res.parsed
-            ]
+        api_client = SandboxApi._get_api_client(config)
+        res = get_sandboxes.sync_detailed(client=api_client, metadata=metadata)
+
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
+
+        if res.parsed is None:
+            return []
+
+        return list(map(SandboxApi._listed_sandbox_from_model, res.parsed))
 
     @classmethod
     def get_info(
@@ -137,37 +201,20 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        with ApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = get_sandboxes_sandbox_id.sync_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = get_sandboxes_sandbox_id.sync_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
+
+        return SandboxApi._sandbox_info_from_detail(res.parsed)
 
-            return SandboxInfo(
-                sandbox_id=SandboxApi._get_sandbox_id(
-                    res.parsed.sandbox_id,
-                    res.parsed.client_id,
-                ),
-                template_id=res.parsed.template_id,
-                name=res.parsed.alias if isinstance(res.parsed.alias, str) else None,
-                metadata=(
-                    res.parsed.metadata if isinstance(res.parsed.metadata, dict) else {}
-                ),
-                started_at=res.parsed.started_at,
-                end_at=res.parsed.end_at,
-                envd_version=res.parsed.envd_version,
-                _envd_access_token=res.parsed.envd_access_token,
-            )
-        
     @classmethod
     def get_instance_no(
         cls,
@@ -199,23 +246,20 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        with ApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = get_sandboxes_sandbox_id_instance_no.sync_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = get_sandboxes_sandbox_id_instance_no.sync_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
+
+        return str(res.parsed)
 
-            return str(res.parsed)
-        
     @classmethod
     def get_instance_auth_info(
         cls,
@@ -248,23 +292,20 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        with ApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = get_sandboxes_sandbox_id_instance_auth_info.sync_detailed(
-                sandbox_id,
-                valid_time=valid_time,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = get_sandboxes_sandbox_id_instance_auth_info.sync_detailed(
+            sandbox_id,
+            valid_time=valid_time,
+            client=api_client,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
 
-            return res.parsed
+        return res.parsed
 
     @classmethod
     def _cls_resume(
@@ -276,6 +317,8 @@ class SandboxApi(SandboxApiBase):
         debug: Optional[bool] = None,
         request_timeout: Optional[float] = None,
     ) -> bool:
+        _brd_details.forget(sandbox_id)
+
         config = ConnectionConfig(
             api_key=api_key,
             domain=domain,
@@ -283,28 +326,25 @@ class SandboxApi(SandboxApiBase):
             request_timeout=request_timeout,
         )
 
-        with ApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = post_sandboxes_sandbox_id_resume.sync_detailed(
-                sandbox_id,
-                client=api_client,
-                body=ResumedSandbox(
-                    timeout=timeout,
-                ),
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = post_sandboxes_sandbox_id_resume.sync_detailed(
+            sandbox_id,
+            client=api_client,
+            body=ResumedSandbox(
+                timeout=timeout,
+            ),
+        )
 
-            if res.status_code == 404:
-                raise Exception(f"Paused sandbox {sandbox_id} not found")
+        if res.status_code == 404:
+            raise Exception(f"Paused sandbox {sandbox_id} not found")
 
-            if res.status_code == 409:
-                return False
+        if res.status_code == 409:
+            return False
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            return True
+        return True
 
     @classmethod
     def _cls_pause(
@@ -315,6 +355,8 @@ class SandboxApi(SandboxApiBase):
         debug: Optional[bool] = None,
         request_timeout: Optional[float] = None,
     ) -> bool:
+        _brd_details.forget(sandbox_id)
+
         config = ConnectionConfig(
             api_key=api_key,
             domain=domain,
@@ -322,25 +364,22 @@ class SandboxApi(SandboxApiBase):
             request_timeout=request_timeout,
         )
 
-        with ApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = post_sandboxes_sandbox_id_pause.sync_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = post_sandboxes_sandbox_id_pause.sync_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code == 404:
-                raise Exception(f"Sandbox {sandbox_id} not found")
+        if res.status_code == 404:
+            raise Exception(f"Sandbox {sandbox_id} not found")
 
-            if res.status_code == 409:
-                return False
+        if res.status_code == 409:
+            return False
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            return True
+        return True
 
     @classmethod
     def _get_adb(
@@ -374,23 +413,20 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        with ApiClient(
-            config,
-            limits=cls._limits,
-        ) as api_client:
-            res = get_sandboxes_sandbox_id_adb.sync_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = get_sandboxes_sandbox_id_adb.sync_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
+
+        return res.parsed
 
-            return res.parsed
-        
     @classmethod
     def _get_adb_public_info(
         cls,
@@ -423,22 +459,19 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        with ApiClient(
-            config,
-            limits=cls._limits,
-        ) as api_client:
-            res = get_sandboxes_sandbox_id_adb_public_info.sync_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = get_sandboxes_sandbox_id_adb_public_info.sync_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
 
-            return res.parsed
+        return res.parsed
 
     @classmethod
     def _get_ssh(
@@ -472,24 +505,53 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        with ApiClient(
-            config,
-            limits=cls._limits,
-        ) as api_client:
-            res = get_sandboxes_sandbox_id_ssh.sync_detailed(
+        api_client = SandboxApi._get_api_client(config)
+        res = _with_retry(
+            lambda: get_sandboxes_sandbox_id_ssh.sync_detailed(
                 sandbox_id,
                 client=api_client,
-            )
+            ),
+            idempotent=True,
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
 
-            return res.parsed
+        return res.parsed
 
 
+    @classmethod
+    def _get_brd_ssh(
+        cls,
+        sandbox_id: str,
+        api_key: Optional[str] = None,
+        domain: Optional[str] = None,
+        debug: Optional[bool] = None,
+        request_timeout: Optional[float] = None,
+        proxy: Optional[ProxyTypes] = None,
+    ) -> SandboxSSH:
+        """
+        Get the SSH information of a brd sandbox, reused for a few seconds by repeated connects.
+        """
+        key = (sandbox_id, api_key, domain, debug, proxy)
+        ssh_info = _brd_details.get(key)
+        if ssh_info is not None:
+            return ssh_info
+
+        ssh_info = cls._get_ssh(
+            sandbox_id=sandbox_id,
+            api_key=api_key,
+            domain=domain,
+            debug=debug,
+            request_timeout=request_timeout,
+            proxy=proxy,
+        )
+        _brd_details.set(key, ssh_info)
+        return ssh_info
+
     @classmethod
     def _cls_kill(
         cls,
@@ -501,6 +563,8 @@ class SandboxApi(SandboxApiBase):
         headers: Optional[Dict[str, str]] = None,
         proxy: Optional[ProxyTypes] = None,
     ) -> bool:
+        _brd_details.forget(sandbox_id)
+
         config = ConnectionConfig(
             api_key=api_key,
             domain=domain,
@@ -514,22 +578,19 @@ class SandboxApi(SandboxApiBase):
             # Skip killing the sandbox in debug mode
             return True
 
-        with ApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = delete_sandboxes_sandbox_id.sync_detailed(
-                sandbox_id,
-                client=api_client,
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = delete_sandboxes_sandbox_id.sync_detailed(
+            sandbox_id,
+            client=api_client,
+        )
 
-            if res.status_code == 404:
-                return False
+        if res.status_code == 404:
+            return False
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            return True
+        return True
 
     @classmethod
     def _cls_set_timeout(
@@ -556,18 +617,15 @@ class SandboxApi(SandboxApiBase):
             # Skip setting timeout in debug mode
             return
 
-        with ApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = post_sandboxes_sandbox_id_timeout.sync_detailed(
-                sandbox_id,
-                client=api_client,
-                body=PostSandboxesSandboxIDTimeoutBody(timeout=timeout),
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = post_sandboxes_sandbox_id_timeout.sync_detailed(
+            sandbox_id,
+            client=api_client,
+            body=PostSandboxesSandboxIDTimeoutBody(timeout=timeout),
+        )
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
     @classmethod
     def _create_sandbox(
@@ -594,8 +652,9 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        with ApiClient(config, limits=SandboxApiBase._limits) as api_client:
-            res = post_sandboxes.sync_detailed(
+        api_client = SandboxApi._get_api_client(config)
+        res = _with_retry(
+            lambda: post_sandboxes.sync_detailed(
                 body=NewSandbox(
                     template_id=template,
                     metadata=metadata or {},
@@ -605,35 +664,37 @@ class SandboxApi(SandboxApiBase):
                     auto_pause=auto_pause,
                 ),
                 client=api_client,
-            )
-
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+            ),
+            idempotent=False,
+        )
 
-            if res.parsed is None:
-                raise Exception("Body of the request is None")
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if Version(res.parsed.envd_version) < Version("0.1.0"):
-                SandboxApi._cls_kill(
-                    SandboxApi._get_sandbox_id(
-                        res.parsed.sandbox_id,
-                        res.parsed.client_id,
-                    )
-                )
-                raise TemplateException(
-                    "You need to update the template to use the new SDK. "
-                    "You can do this by running `agentbox template build` in the directory with the template."
-                )
+        if res.parsed is None:
+            raise Exception("Body of the request is None")
 
-            return SandboxCreateResponse(
-                sandbox_id=SandboxApi._get_sandbox_id(
+        if parse_envd_version(res.parsed.envd_version) < _ENVD_VERSION_MINIMUM_KEY:
+            SandboxApi._cls_kill(
+                SandboxApi._get_sandbox_id(
                     res.parsed.sandbox_id,
                     res.parsed.client_id,
-                ),
-                envd_version=res.parsed.envd_version,
-                envd_access_token=res.parsed.envd_access_token,
+                )
+            )
+            raise TemplateException(
+                "You need to update the template to use the new SDK. "
+                "You can do this by running `agentbox template build` in the directory with the template."
             )
 
+        return SandboxCreateResponse(
+            sandbox_id=SandboxApi._get_sandbox_id(
+                res.parsed.sandbox_id,
+                res.parsed.client_id,
+            ),
+            envd_version=res.parsed.envd_version,
+            envd_access_token=_str_or_none(res.parsed.envd_access_token),
+        )
+
     @classmethod
     def _cls_connect(
         cls,
@@ -656,28 +717,25 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        with ApiClient(
-            config,
-            limits=SandboxApiBase._limits,
-        ) as api_client:
-            res = post_sandboxes_sandbox_id_connect.sync_detailed(
-                sandbox_id,
-                client=api_client,
-                body=ConnectSandbox(
-                    timeout=timeout,
-                ),
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = post_sandboxes_sandbox_id_connect.sync_detailed(
+            sandbox_id,
+            client=api_client,
+            body=ConnectSandbox(
+                timeout=timeout,
+            ),
+        )
 
-            if res.status_code == 404:
-                raise Exception(f"Sandbox {sandbox_id} not found")
+        if res.status_code == 404:
+            raise Exception(f"Sandbox {sandbox_id} not found")
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
 
-            if isinstance(res.parsed, Error):
-                raise SandboxException(f"{res.parsed.message}: Request failed")
+        if isinstance(res.parsed, Error):
+            raise SandboxException(f"{res.parsed.message}: Request failed")
 
-            return res.parsed
+        return res.parsed
 
     @classmethod
     def _cls_set_model_information(
@@ -702,18 +760,21 @@ class SandboxApi(SandboxApiBase):
             proxy=proxy,
         )
 
-        with ApiClient(config, limits=SandboxApiBase._limits) as api_client:
-            res = post_sandboxes_sandbox_id_model_information.sync_detailed(
-                sandbox_id=sandbox_id,
-                client=api_client,
-                body=ModelInformationRequest(
-                    model=model,
-                    brand=brand,
-                    manufacturer=manufacturer,
-                ),
-            )
+        api_client = SandboxApi._get_api_client(config)
+        res = post_sandboxes_sandbox_id_model_information.sync_detailed(
+            sandbox_id=sandbox_id,
+            client=api_client,
+            body=ModelInformationRequest(
+                model=model,
+                brand=brand,
+                manufacturer=manufacturer,
+            ),
+        )
+
+        if res.status_code >= 300:
+            raise handle_api_exception(res)
+
+        return res.parsed
 
-            if res.status_code >= 300:
-                raise handle_api_exception(res)
 
-            return res.parsed
\ No newline at end of file
+atexit.register(SandboxApi.close_api_clients)
@@ -0,0 +1,38 @@
+import httpx
+import pytest
+
+from agentbox.sandbox_async import sandbox_api as async_sandbox_api
+from agentbox.sandbox_sync import sandbox_api as sync_sandbox_api
+
+
+class MockApi:
+    """
+    Stands in for the API host, `respond` maps each request to a response.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.respond = lambda request: httpx.Response(200, json=[])
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return self.respond(request)
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    api = MockApi()
+    monkeypatch.setattr(
+        sync_sandbox_api,
+        "HTTPTransport",
+        lambda **kwargs: httpx.MockTransport(api.handle),
+    )
+    monkeypatch.setattr(
+        async_sandbox_api,
+        "AsyncHTTPTransport",
+        lambda **kwargs: httpx.MockTransport(api.handle),
+    )
+    # Clients created before the transports were mocked must not be reused
+    sync_sandbox_api.SandboxApi.close_api_clients()
+    yield api
+    sync_sandbox_api.SandboxApi.close_api_clients()
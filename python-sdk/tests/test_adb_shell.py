@@ -0,0 +1,45 @@
+from agentbox.connection_config import ConnectionConfig
+from agentbox.sandbox_sync.adb_shell.adb_shell import ADBShell
+
+
+class _Device:
+    available = True
+    closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def _adb_shell(monkeypatch):
+    adb_shell = ADBShell(ConnectionConfig(debug=True), "sbx-brd")
+    devices = []
+
+    def adb_connect():
+        adb_shell._device = _Device()
+        devices.append(adb_shell._device)
+
+    monkeypatch.setattr(adb_shell, "_adb_connect", adb_connect)
+    return adb_shell, devices
+
+
+def test_with_block_closes_the_session_it_opened(monkeypatch):
+    adb_shell, devices = _adb_shell(monkeypatch)
+
+    with adb_shell:
+        with adb_shell:
+            pass
+        assert not devices[0].closed
+
+    assert devices[0].closed
+
+
+def test_with_block_keeps_a_session_opened_by_the_caller(monkeypatch):
+    adb_shell, devices = _adb_shell(monkeypatch)
+    adb_shell.connect()
+
+    with adb_shell:
+        pass
+
+    assert len(devices) == 1
+    assert not devices[0].closed
+    adb_shell.close()
@@ -0,0 +1,133 @@
+import asyncio
+import httpx
+
+from agentbox.connection_config import ConnectionConfig
+from agentbox.sandbox_async import sandbox_api as async_sandbox_api
+from agentbox.sandbox_sync import sandbox_api as sync_sandbox_api
+
+
+def test_sync_api_client_is_shared_across_keys_and_headers(mock_api):
+    SandboxApi = sync_sandbox_api.SandboxApi
+    requests = mock_api.requests
+
+    for i in range(10):
+        config = ConnectionConfig(
+            api_key=f"key-{i}",
+            debug=True,
+            headers={"X-Access-Token": f"token-{i}"},
+        )
+        SandboxApi._get_api_client(config).get_httpx_client().request(
+            method="GET", url="/sandboxes"
+        )
+
+    assert len(sync_sandbox_api._api_http_clients) == 1
+    assert [r.headers["X-API-KEY"] for r in requests] == [
+        f"key-{i}" for i in range(10)
+    ]
+    assert [r.headers["X-Access-Token"] for r in requests] == [
+        f"token-{i}" for i in range(10)
+    ]
+    assert all(r.headers["lang"] == "python" for r in requests)
+
+
+def test_sync_api_client_per_host_and_proxy(mock_api):
+    SandboxApi = sync_sandbox_api.SandboxApi
+
+    SandboxApi._get_api_client(ConnectionConfig(api_key="k", domain="a.dev"))
+    SandboxApi._get_api_client(ConnectionConfig(api_key="k", domain="b.dev"))
+    SandboxApi._get_api_client(
+        ConnectionConfig(api_key="k", domain="a.dev", proxy="http://proxy:8080")
+    )
+    SandboxApi._get_api_client(ConnectionConfig(api_key="other", domain="a.dev"))
+
+    assert len(sync_sandbox_api._api_http_clients) == 3
+
+
+def test_sync_close_api_clients(mock_api):
+    SandboxApi = sync_sandbox_api.SandboxApi
+    requests = mock_api.requests
+
+    assert SandboxApi.list(api_key="k", debug=True) == []
+    http_client = next(iter(sync_sandbox_api._api_http_clients.values()))
+
+    SandboxApi.close_api_clients()
+
+    assert http_client.is_closed
+    assert not sync_sandbox_api._api_http_clients
+    assert SandboxApi.list(api_key="k", debug=True) == []
+    assert len(requests) == 2
+
+
+async def test_async_api_client_is_shared_across_keys_and_headers(mock_api):
+    SandboxApi = async_sandbox_api.SandboxApi
+    requests = mock_api.requests
+
+    for i in range(10):
+        await SandboxApi.list(
+            api_key=f"key-{i}",
+            debug=True,
+            headers={"X-Access-Token": f"token-{i}"},
+        )
+
+    http_clients = async_sandbox_api._api_http_clients[
+        asyncio.get_running_loop()
+    ]
+    assert len(http_clients) == 1
+    assert [r.headers["X-API-KEY"] for r in requests] == [
+        f"key-{i}" for i in range(10)
+    ]
+    assert [r.headers["X-Access-Token"] for r in requests] == [
+        f"token-{i}" for i in range(10)
+    ]
+
+    await SandboxApi.close_api_clients()
+    assert all(c.is_closed for c in http_clients.values())
+
+
+def test_sync_api_client_with_proxy_uses_shared_transport(mock_api):
+    SandboxApi = sync_sandbox_api.SandboxApi
+    config = ConnectionConfig(api_key="k", debug=True, proxy="http://proxy:8080")
+
+    SandboxApi._get_api_client(config).get_httpx_client().request(
+        method="GET", url="/sandboxes"
+    )
+
+    # The transport is set up for the proxy, httpx must not mount another one
+    assert len(mock_api.requests) == 1
+
+
+def test_sync_api_client_shared_for_equal_proxy_objects(mock_api):
+    SandboxApi = sync_sandbox_api.SandboxApi
+
+    for _ in range(3):
+        SandboxApi._get_api_client(
+            ConnectionConfig(api_key="k", proxy=httpx.Proxy("http://proxy:8080"))
+        )
+        SandboxApi._get_api_client(
+            ConnectionConfig(api_key="k", proxy=httpx.URL("http://proxy:8080"))
+        )
+    SandboxApi._get_api_client(
+        ConnectionConfig(api_key="k", proxy=httpx.Proxy("http://other:8080"))
+    )
+
+    assert len(sync_sandbox_api._api_http_clients) == 2
+
+
+def test_sync_api_client_has_no_timeout(mock_api):
+    SandboxApi = sync_sandbox_api.SandboxApi
+
+    for request_timeout in (None, 120):
+        config = ConnectionConfig(
+            api_key="k", debug=True, request_timeout=request_timeout
+        )
+        SandboxApi._get_api_client(config).get_httpx_client().request(
+            method="GET", url="/sandboxes"
+        )
+
+    http_client = next(iter(sync_sandbox_api._api_http_clients.values()))
+    # Like the old per call clients, control plane calls never time out
+    assert http_client.timeout == httpx.Timeout(None)
+    assert [r.extensions["timeout"]["read"] for r in mock_api.requests] == [
+        None,
+        None,
+    ]
@@ -0,0 +1,94 @@
+import httpx
+import pytest
+
+from agentbox.sandbox_async import main as async_main
+from agentbox.sandbox_async.main import AsyncSandbox
+from agentbox.sandbox_sync import main as sync_main
+from agentbox.sandbox_sync.main import Sandbox
+
+
+@pytest.fixture
+def auth_api(mock_api, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sync_main.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(async_main.time, "monotonic", lambda: now[0])
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/sandboxes/debug_sandbox_id/instance-auth-info"
+        return httpx.Response(
+            200,
+            json={
+                "accessKey": f"key-{len(mock_api.requests)}",
+                "accessSecretKey": "secret",
+                "expireTime": "never",
+                "instanceNo": "instance",
+                "userId": "user",
+            },
+        )
+
+    mock_api.respond = respond
+    mock_api.now = now
+    return mock_api
+
+
+def test_sync_auth_info_not_cached_by_default(auth_api):
+    sandbox = Sandbox(api_key="k", debug=True)
+
+    first = sandbox.get_instance_auth_info()
+    second = sandbox.get_instance_auth_info()
+
+    assert (first.access_key, second.access_key) == ("key-1", "key-2")
+    assert auth_api.requests[0].url.params["valid_time"] == "3600"
+
+
+def test_sync_auth_info_cache(auth_api):
+    sandbox = Sandbox(api_key="k", debug=True)
+    margin = Sandbox.auth_info_expiry_margin
+
+    first = sandbox.get_instance_auth_info(valid_time=600, use_cache=True)
+    assert sandbox.get_instance_auth_info(valid_time=600, use_cache=True) is first
+    # Cached per valid_time
+    assert sandbox.get_instance_auth_info(valid_time=900, use_cache=True) is not first
+
+    auth_api.now[0] += 600 - margin - 1
+    assert sandbox.get_instance_auth_info(valid_time=600, use_cache=True) is first
+
+    # Refreshed once within the expiry margin
+    auth_api.now[0] += 1
+    refreshed = sandbox.get_instance_auth_info(valid_time=600, use_cache=True)
+    assert refreshed is not first
+    assert len(auth_api.requests) == 3
+
+    sandbox.clear_auth_cache()
+    assert sandbox.get_instance_auth_info(valid_time=600, use_cache=True) is not refreshed
+    assert len(auth_api.requests) == 4
+
+
+async def test_async_auth_info_not_cached_by_default(auth_api):
+    sandbox = await AsyncSandbox.create(api_key="k", debug=True)
+
+    first = await sandbox.get_instance_auth_info(valid_time=600)
+    second = await sandbox.get_instance_auth_info(valid_time=600)
+
+    assert (first.access_key, second.access_key) == ("key-1", "key-2")
+
+
+async def test_async_auth_info_cache(auth_api):
+    sandbox = await AsyncSandbox.create(api_key="k", debug=True)
+    margin = AsyncSandbox.auth_info_expiry_margin
+
+    first = await sandbox.get_instance_auth_info(valid_time=600, use_cache=True)
+    assert await sandbox.get_instance_auth_info(valid_time=600, use_cache=True) is first
+
+    auth_api.now[0] += 600 - margin
+    refreshed = await sandbox.get_instance_auth_info(valid_time=600, use_cache=True)
+    assert refreshed is not first
+
+    sandbox.clear_auth_cache()
+    assert (
+        await sandbox.get_instance_auth_info(valid_time=600, use_cache=True)
+        is not refreshed
+    )
+    assert len(auth_api.requests) == 3
+
+    await async_main.SandboxApi.close_api_clients()
@@ -0,0 +1,141 @@
+import time
+
+import httpx
+import pytest
+
+from agentbox.sandbox.sandbox_api import _BrdDetailsCache
+from agentbox.sandbox_async import sandbox_api as async_sandbox_api
+from agentbox.sandbox_sync import sandbox_api as sync_sandbox_api
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = _BrdDetailsCache()
+    cache.set(("sbx",), "details")
+
+    clock[0] += cache.ttl - 0.1
+    assert cache.get(("sbx",)) == "details"
+
+    clock[0] += 0.1
+    assert cache.get(("sbx",)) is None
+
+
+def test_oldest_entry_is_evicted(clock):
+    cache = _BrdDetailsCache()
+    for i in range(cache.max_size):
+        cache.set((f"sbx-{i}",), i)
+    # Setting an entry again makes it the newest
+    cache.set(("sbx-0",), 0)
+
+    cache.set(("sbx-new",), "new")
+
+    assert cache.get(("sbx-0",)) == 0
+    assert cache.get(("sbx-1",)) is None
+    assert cache.get(("sbx-2",)) == 2
+    assert cache.get(("sbx-new",)) == "new"
+
+
+def test_forget_drops_every_key_of_the_sandbox(clock):
+    cache = _BrdDetailsCache()
+    cache.set(("sbx", "key-a"), "a")
+    cache.set(("sbx", "key-b"), "b")
+    cache.set(("other", "key-a"), "c")
+
+    cache.forget("sbx")
+
+    assert cache.get(("sbx", "key-a")) is None
+    assert cache.get(("sbx", "key-b")) is None
+    assert cache.get(("other", "key-a")) == "c"
+
+
+@pytest.fixture
+def brd_api(mock_api, clock):
+    sync_sandbox_api._brd_details.clear()
+    async_sandbox_api._brd_details.clear()
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return httpx.Response(204)
+        kind = request.url.path.rsplit("/", 1)[1]
+        details = {
+            "authPassword": f"password-{len(mock_api.requests)}",
+            "connectCommand": "ssh -p 2222 user@host",
+            "expireTime": "never",
+            "instanceNo": "instance",
+        }
+        if kind == "adb":
+            details.update(adbAuthCommand="adb auth", forwarderCommand="forward")
+        return httpx.Response(200, json=details)
+
+    mock_api.respond = respond
+    yield mock_api
+    sync_sandbox_api._brd_details.clear()
+    async_sandbox_api._brd_details.clear()
+
+
+def _ssh_requests(api):
+    return [r for r in api.requests if r.url.path.endswith("/ssh")]
+
+
+def test_sync_ssh_details_are_reused(brd_api, clock):
+    SandboxApi = sync_sandbox_api.SandboxApi
+
+    first = SandboxApi._get_brd_ssh("brd", api_key="k", debug=True)
+    assert SandboxApi._get_brd_ssh("brd", api_key="k", debug=True) is first
+    assert len(_ssh_requests(brd_api)) == 1
+
+    # Other credentials or proxies do not share entries
+    SandboxApi._get_brd_ssh("brd", api_key="other", debug=True)
+    SandboxApi._get_brd_ssh("brd", api_key="k", debug=True, proxy="http://p:1")
+    assert len(_ssh_requests(brd_api)) == 3
+
+    clock[0] += _BrdDetailsCache.ttl
+    assert SandboxApi._get_brd_ssh("brd", api_key="k", debug=True) is not first
+    assert len(_ssh_requests(brd_api)) == 4
+
+
+@pytest.mark.parametrize(
+    "call",
+    [
+        lambda api: api._cls_kill("brd", api_key="k", debug=True),
+        lambda api: api._cls_pause("brd", api_key="k", debug=True),
+        lambda api: api._cls_resume("brd", timeout=60, api_key="k", debug=True),
+    ],
+    ids=["kill", "pause", "resume"],
+)
+def test_sync_lifecycle_calls_drop_details(brd_api, call):
+    SandboxApi = sync_sandbox_api.SandboxApi
+
+    first = SandboxApi._get_brd_ssh("brd", api_key="k", debug=True)
+    call(SandboxApi)
+
+    assert SandboxApi._get_brd_ssh("brd", api_key="k", debug=True) is not first
+    assert len(_ssh_requests(brd_api)) == 2
+
+
+async def test_async_details_are_reused(brd_api):
+    SandboxApi = async_sandbox_api.SandboxApi
+
+    ssh, adb = await SandboxApi._get_brd_details("brd", api_key="k", debug=True)
+    assert await SandboxApi._get_brd_details("brd", api_key="k", debug=True) == (
+        ssh,
+        adb,
+    )
+    assert len(brd_api.requests) == 2
+
+    await SandboxApi._get_brd_details(
+        "brd", api_key="k", debug=True, proxy="http://p:1"
+    )
+    assert len(brd_api.requests) == 4
+
+    await SandboxApi._cls_kill("brd", api_key="k", debug=True)
+    new_ssh, _ = await SandboxApi._get_brd_details("brd", api_key="k", debug=True)
+    assert new_ssh is not ssh
+
+    await SandboxApi.close_api_clients()
@@ -0,0 +1,13 @@
+from agentbox.sandbox_async.main import AsyncSandbox
+
+
+async def test_debug_sandboxes_read_connection_env_per_sandbox(monkeypatch):
+    monkeypatch.delenv("AGENTBOX_API_KEY", raising=False)
+    first = await AsyncSandbox.create(debug=True)
+
+    monkeypatch.setenv("AGENTBOX_API_KEY", "key")
+    second = await AsyncSandbox.create(debug=True)
+
+    assert first.connection_config.api_key is None
+    assert second.connection_config.api_key == "key"
+    assert first.connection_config is not second.connection_config
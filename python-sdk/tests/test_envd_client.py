@@ -0,0 +1,56 @@
+import gc
+
+import httpx
+
+from agentbox.connection_config import ConnectionConfig
+from agentbox.sandbox.main import SandboxSetup
+from agentbox.sandbox_async import main as async_main
+from agentbox.sandbox_sync import main as sync_main
+
+_URL = "https://49983-sbx.agentbox.cloud"
+
+
+def _config(token: str) -> ConnectionConfig:
+    return ConnectionConfig(api_key="k", headers={"X-Access-Token": token})
+
+
+def test_sync_envd_clients_are_shared_and_released():
+    limits = SandboxSetup._limits
+
+    first = sync_main._get_shared_envd_api(_URL, _config("a"), limits)
+    same = sync_main._get_shared_envd_api(_URL, _config("a"), limits)
+    other = sync_main._get_shared_envd_api(_URL, _config("b"), limits)
+
+    assert same is first
+    assert other is not first
+    assert other.headers["X-Access-Token"] == "b"
+    # Different tokens still share the connection pool
+    assert other._transport is first._transport
+
+    key = (_URL, None, (("X-Access-Token", "a"),))
+    assert key in sync_main._envd_clients
+    del first, same
+    gc.collect()
+    assert key not in sync_main._envd_clients
+
+
+async def test_async_envd_clients_are_shared_per_loop():
+    limits = SandboxSetup._limits
+
+    first = async_main._get_shared_envd_api(_URL, _config("a"), limits)
+    assert async_main._get_shared_envd_api(_URL, _config("a"), limits) is first
+    other = async_main._get_shared_envd_api(_URL, _config("b"), limits)
+    assert other is not first
+    assert other._transport is first._transport
+
+    await first.aclose()
+
+
+def test_async_envd_client_outside_loop_is_not_shared():
+    limits = SandboxSetup._limits
+
+    first = async_main._get_shared_envd_api(_URL, _config("a"), limits)
+    second = async_main._get_shared_envd_api(_URL, _config("a"), limits)
+
+    assert isinstance(first, httpx.AsyncClient)
+    assert first is not second
@@ -0,0 +1,53 @@
+import pytest
+
+from packaging.version import Version
+
+from agentbox.envd.versions import (
+    ENVD_VERSION_MINIMUM,
+    ENVD_VERSION_RECURSIVE_WATCH,
+    _ENVD_VERSION_MINIMUM_KEY,
+    _ENVD_VERSION_RECURSIVE_WATCH_KEY,
+    parse_envd_version,
+)
+
+_VERSIONS = [
+    "0.0.9",
+    "0.1.0.dev1",
+    "0.1.0rc1",
+    "0.1.0",
+    "0.1.0.0",
+    "0.1.0.post1",
+    "0.1.3",
+    "0.1.4.dev0",
+    "0.1.4a1",
+    "0.1.4rc1",
+    "0.1.4rc1.post1",
+    "0.1.4",
+    "0.1.4.0",
+    "0.1.4+local",
+    "0.1.4.post1.dev0",
+    "0.1.4.post1",
+    "0.1.4.0.1",
+    "0.1.4.1rc1",
+    "0.1.5.dev0",
+    "0.2",
+    "1.0.0",
+]
+
+
+def test_public_thresholds_are_versions():
+    assert isinstance(ENVD_VERSION_RECURSIVE_WATCH, Version)
+    assert isinstance(ENVD_VERSION_MINIMUM, Version)
+    assert Version("0.1.3") < ENVD_VERSION_RECURSIVE_WATCH
+
+
+@pytest.mark.parametrize("version", _VERSIONS)
+@pytest.mark.parametrize(
+    "threshold, key",
+    [
+        (ENVD_VERSION_RECURSIVE_WATCH, _ENVD_VERSION_RECURSIVE_WATCH_KEY),
+        (ENVD_VERSION_MINIMUM, _ENVD_VERSION_MINIMUM_KEY),
+    ],
+)
+def test_parsed_version_orders_like_version(version, threshold, key):
+    assert (parse_envd_version(version) < key) == (Version(version) < threshold)
@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http import HTTPStatus
+
+import httpx
+import pytest
+
+from agentbox.api.client.types import Response
+from agentbox.sandbox import sandbox_api as base_sandbox_api
+from agentbox.sandbox_async.sandbox_api import _with_retry as async_with_retry
+from agentbox.sandbox_sync.sandbox_api import _with_retry as sync_with_retry
+
+
+def _response(status_code: int, headers=None) -> Response[None]:
+    return Response(
+        status_code=HTTPStatus(status_code),
+        content=b"",
+        headers=httpx.Headers(headers or {}),
+        parsed=None,
+    )
+
+
+class _Requests:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def next(self):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def async_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(time, "sleep", delays.append)
+    monkeypatch.setattr(asyncio, "sleep", async_sleep)
+    return delays
+
+
+def _sync(requests, idempotent):
+    return sync_with_retry(requests.next, idempotent=idempotent)
+
+
+def _async(requests, idempotent):
+    async def request():
+        return requests.next()
+
+    return asyncio.run(async_with_retry(request, idempotent=idempotent))
+
+
+@pytest.fixture(params=[_sync, _async], ids=["sync", "async"])
+def with_retry(request):
+    return request.param
+
+
+@pytest.mark.parametrize("status_code", [429, 500, 502, 503, 504])
+def test_idempotent_retries_status(with_retry, sleeps, status_code):
+    requests = _Requests(_response(status_code), _response(200))
+
+    assert with_retry(requests, idempotent=True).status_code == 200
+    assert requests.calls == 2
+    assert len(sleeps) == 1
+
+
+def test_idempotent_gives_up_after_all_attempts(with_retry, sleeps):
+    requests = _Requests(*[_response(503)] * 5)
+
+    assert with_retry(requests, idempotent=True).status_code == 503
+    assert requests.calls == base_sandbox_api._RETRY_ATTEMPTS
+
+
+@pytest.mark.parametrize("status_code", [200, 400, 401, 404, 409])
+def test_other_status_not_retried(with_retry, sleeps, status_code):
+    requests = _Requests(_response(status_code))
+
+    assert with_retry(requests, idempotent=True).status_code == status_code
+    assert requests.calls == 1
+    assert not sleeps
+
+
+@pytest.mark.parametrize("status_code", [500, 502, 503, 504])
+def test_create_not_retried_on_server_errors(with_retry, sleeps, status_code):
+    requests = _Requests(_response(status_code), _response(201))
+
+    assert with_retry(requests, idempotent=False).status_code == status_code
+    assert requests.calls == 1
+    assert not sleeps
+
+
+def test_create_retried_on_rate_limit(with_retry, sleeps):
+    requests = _Requests(_response(429), _response(429), _response(201))
+
+    assert with_retry(requests, idempotent=False).status_code == 201
+    assert requests.calls == 3
+
+
+def test_transport_error_retried_only_when_idempotent(with_retry, sleeps):
+    requests = _Requests(httpx.ConnectError("down"), _response(200))
+    assert with_retry(requests, idempotent=True).status_code == 200
+    assert requests.calls == 2
+
+    requests = _Requests(httpx.ConnectError("down"), _response(201))
+    with pytest.raises(httpx.ConnectError):
+        with_retry(requests, idempotent=False)
+    assert requests.calls == 1
+
+
+def test_retry_after_seconds_is_honoured(with_retry, sleeps):
+    requests = _Requests(_response(429, {"Retry-After": "3"}), _response(201))
+
+    assert with_retry(requests, idempotent=False).status_code == 201
+    assert sleeps == [3.0]
+
+
+def test_retry_after_date_is_honoured(with_retry, sleeps):
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=5)
+    requests = _Requests(
+        _response(429, {"Retry-After": format_datetime(retry_at, usegmt=True)}),
+        _response(201),
+    )
+
+    assert with_retry(requests, idempotent=False).status_code == 201
+    assert len(sleeps) == 1 and 3 < sleeps[0] <= 5
+
+
+def test_long_retry_after_is_not_waited_out(with_retry, sleeps):
+    requests = _Requests(_response(429, {"Retry-After": "120"}), _response(201))
+
+    assert with_retry(requests, idempotent=False).status_code == 429
+    assert requests.calls == 1
+    assert not sleeps
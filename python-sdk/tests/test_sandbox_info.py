@@ -0,0 +1,58 @@
+import copy
+import dataclasses
+import json
+import pickle
+
+from agentbox.api.client.models import ListedSandbox as ListedSandboxModel
+from agentbox.api.client.models import SandboxDetail
+from agentbox.sandbox.sandbox_api import SandboxApiBase, SandboxQuery
+
+_SANDBOX = {
+    "clientID": "client",
+    "cpuCount": 2,
+    "endAt": "2025-01-01T01:00:00Z",
+    "memoryMB": 512,
+    "sandboxID": "sbx",
+    "startedAt": "2025-01-01T00:00:00Z",
+    "state": "running",
+    "templateID": "base",
+}
+
+
+def test_sandbox_info_metadata_is_a_plain_dict():
+    model = SandboxDetail.from_dict({**_SANDBOX, "metadata": {"user": "a"}})
+    info = SandboxApiBase._sandbox_info_from_detail(model)
+
+    assert type(info.metadata) is dict
+    assert info.metadata == {"user": "a"}
+    assert dataclasses.asdict(info)["metadata"] == {"user": "a"}
+    assert json.loads(json.dumps(info.metadata)) == {"user": "a"}
+    assert copy.deepcopy(info) == info
+    assert pickle.loads(pickle.dumps(info)) == info
+
+    # Changing it leaves the model alone
+    info.metadata["user"] = "b"
+    assert model.metadata == {"user": "a"}
+
+
+def test_listed_sandbox_without_metadata():
+    listed = SandboxApiBase._listed_sandbox_from_model(
+        ListedSandboxModel.from_dict(_SANDBOX)
+    )
+    other = SandboxApiBase._listed_sandbox_from_model(
+        ListedSandboxModel.from_dict(_SANDBOX)
+    )
+
+    assert listed.metadata == {}
+    assert type(listed.metadata) is dict
+    assert listed.metadata is not other.metadata
+    assert dataclasses.asdict(listed)["metadata"] == {}
+
+
+def test_sandbox_query_is_mutable_and_slotted():
+    query = SandboxQuery()
+    query.metadata = {"key": "value"}
+
+    assert query == SandboxQuery(metadata={"key": "value"})
+    assert SandboxQuery() != (None,)
+    assert not hasattr(query, "__dict__")
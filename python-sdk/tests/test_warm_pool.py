@@ -0,0 +1,188 @@
+import asyncio
+import itertools
+
+import pytest
+
+from agentbox.sandbox_async import main as async_main
+from agentbox.sandbox_async.main import AsyncSandbox
+
+
+class _PooledSandbox:
+    ids = itertools.count()
+
+    def __init__(self, opts):
+        self.sandbox_id = f"sbx-{next(self.ids)}"
+        self.opts = opts
+        self.timeouts = []
+        self.killed = False
+        self.gone = False
+
+    async def set_timeout(self, timeout):
+        if self.gone:
+            raise Exception("sandbox not found")
+        self.timeouts.append(timeout)
+
+    async def kill(self):
+        self.killed = True
+
+
+class PoolSandbox(AsyncSandbox):
+    __slots__ = ()
+
+    created = []
+    create_gate = None
+
+    @classmethod
+    async def beta_create(cls, **opts):
+        if cls.create_gate is not None:
+            await cls.create_gate.wait()
+        sandbox = _PooledSandbox(opts)
+        cls.created.append(sandbox)
+        return sandbox
+
+    @classmethod
+    async def beta_create_many(cls, count, **opts):
+        return [await cls.beta_create(**opts) for _ in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def reset_pool_sandbox():
+    PoolSandbox.created = []
+    PoolSandbox.create_gate = None
+    yield
+
+
+async def _settle():
+    await asyncio.gather(*async_main._warm_pool_tasks)
+
+
+async def test_take_from_pool_restarts_timeout_and_refills():
+    await PoolSandbox.ensure_warm(2, template="t", timeout=120)
+    assert len(PoolSandbox.created) == 2
+
+    sandbox = await PoolSandbox.beta_create_from_pool("t")
+    await _settle()
+
+    assert sandbox is PoolSandbox.created[0]
+    assert sandbox.timeouts == [120]
+    assert len(PoolSandbox.created) == 3
+    pool = async_main._warm_pools[asyncio.get_running_loop()][(PoolSandbox, "t")]
+    assert len(pool) == 2
+
+    await PoolSandbox.drain_warm_pool("t")
+    assert all(s.killed for s in PoolSandbox.created[1:])
+
+
+async def test_ensure_warm_keeps_refills_in_flight():
+    await PoolSandbox.ensure_warm(1, template="t", timeout=60)
+    PoolSandbox.create_gate = asyncio.Event()
+
+    await PoolSandbox.beta_create_from_pool("t")
+    # Refill is blocked on create, calling ensure_warm again must not orphan it
+    await PoolSandbox.ensure_warm(0, template="t", timeout=90)
+    PoolSandbox.create_gate.set()
+    await _settle()
+
+    refilled = PoolSandbox.created[-1]
+    assert not refilled.killed
+    assert refilled.opts["timeout"] == 90
+    pool = async_main._warm_pools[asyncio.get_running_loop()][(PoolSandbox, "t")]
+    assert [s for _, s in pool.sandboxes] == [refilled]
+
+    await PoolSandbox.drain_warm_pool("t")
+
+
+async def test_drain_kills_refills_in_flight():
+    await PoolSandbox.ensure_warm(1, template="t")
+    PoolSandbox.create_gate = asyncio.Event()
+
+    await PoolSandbox.beta_create_from_pool("t")
+    await PoolSandbox.drain_warm_pool("t")
+    PoolSandbox.create_gate.set()
+    await _settle()
+
+    assert PoolSandbox.created[-1].killed
+
+
+async def test_expired_sandboxes_are_not_handed_out(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(async_main.time, "monotonic", lambda: now[0])
+
+    await PoolSandbox.ensure_warm(2, template="t", timeout=100)
+    stale = list(PoolSandbox.created)
+    now[0] += 100 - async_main._WarmPool.expiry_margin
+
+    sandbox = await PoolSandbox.beta_create_from_pool("t")
+    await _settle()
+
+    assert sandbox not in stale
+    assert all(s.killed for s in stale)
+    # Both stale sandboxes were replaced, and the fresh one was handed out
+    pool = async_main._warm_pools[asyncio.get_running_loop()][(PoolSandbox, "t")]
+    assert len(pool) == 2
+
+    await PoolSandbox.drain_warm_pool("t")
+
+
+async def test_gone_sandbox_is_skipped():
+    await PoolSandbox.ensure_warm(2, template="t")
+    PoolSandbox.created[0].gone = True
+
+    sandbox = await PoolSandbox.beta_create_from_pool("t")
+    await _settle()
+
+    assert sandbox is PoolSandbox.created[1]
+    assert sandbox.timeouts == [AsyncSandbox.default_sandbox_timeout]
+
+    await PoolSandbox.drain_warm_pool("t")
+
+
+def test_pools_are_per_event_loop():
+    async def fill():
+        await PoolSandbox.ensure_warm(1, template="t")
+
+    async def take():
+        return await PoolSandbox.beta_create_from_pool("t")
+
+    asyncio.run(fill())
+    pooled = PoolSandbox.created[0]
+
+    # A new loop has no pool, the sandbox of the other loop is not reused
+    sandbox = asyncio.run(take())
+    assert sandbox is not pooled
+    assert sandbox.opts == {"template": "t"}
+
+
+async def test_concurrent_ensure_warm_does_not_overfill():
+    PoolSandbox.create_gate = asyncio.Event()
+
+    calls = asyncio.gather(
+        PoolSandbox.ensure_warm(2, template="t"),
+        PoolSandbox.ensure_warm(2, template="t"),
+    )
+    await asyncio.sleep(0)
+    PoolSandbox.create_gate.set()
+    await calls
+
+    assert len(PoolSandbox.created) == 2
+    pool = async_main._warm_pools[asyncio.get_running_loop()][(PoolSandbox, "t")]
+    assert len(pool) == 2
+
+    await PoolSandbox.drain_warm_pool("t")
+
+
+async def test_drained_refill_kill_failure_is_logged(monkeypatch, caplog):
+    await PoolSandbox.ensure_warm(1, template="t")
+    PoolSandbox.create_gate = asyncio.Event()
+
+    await PoolSandbox.beta_create_from_pool("t")
+    await PoolSandbox.drain_warm_pool("t")
+
+    async def kill(self):
+        raise Exception("kill failed")
+
+    monkeypatch.setattr(_PooledSandbox, "kill", kill)
+    PoolSandbox.create_gate.set()
+    await _settle()
+
+    assert "Failed to kill sandbox" in caplog.text